@@ -1,15 +1,27 @@
 from opcodetools.assembler.assembler import Assembler, ASMException
+from opcodetools.assembler.build_cache import BuildCache
 
 import sys
 import os
 
 # asm test.asm -o test.bin -l test.lst -m test.lab.asm -d value=0x71
+# Add -2 to always run the full second pass (instead of patching forward references)
+# Add -f 0x00 to fill gaps with something other than 0xFF
+# Add -s to write each segment to its own file (test_8000.bin, test_FFFA.bin, ... the
+# same for .hex and .s19 outputs)
+# Name the output .hex (or .ihx) for Intel HEX or .s19 (.s28, .s37, .srec, .mot) for
+# Motorola S-records instead of a raw binary (the gaps between segments are skipped)
+# Add -i to keep a build cache so the next build only redoes the changed files and lines
 
 a,b = sys.argv[1].split('.')
 bin_name = a+".bin"
 lst_name = None
 lab_name = None
 defines = {}
+two_pass = False
+fill = 0xFF
+split = False
+incremental = False
 for i in range(2, len(sys.argv)):
     if sys.argv[i].startswith('-o'):
         bin_name = sys.argv[i+1]
@@ -24,12 +36,23 @@ for i in range(2, len(sys.argv)):
         key, value = sys.argv[i+1].split('=')
         defines[key] = int(value, 0)
         i+=1
+    elif sys.argv[i] == '-2':
+        two_pass = True
+    elif sys.argv[i] == '-f':
+        fill = int(sys.argv[i+1], 0)
+    elif sys.argv[i] == '-s':
+        split = True
+    elif sys.argv[i] == '-i':
+        incremental = True
 
 try:
-    a = Assembler(sys.argv[1], defines)
-    a.assemble()
+    cache = BuildCache(sys.argv[1]) if incremental else None
+    a = Assembler(sys.argv[1], defines, cache)
+    a.assemble(two_pass)
+    if cache:
+        cache.save()
 
-    a.write_binary(bin_name) 
+    a.write_image(bin_name, fill, split)
 
     if lst_name:          
         a.write_listing(lst_name)
@@ -0,0 +1,151 @@
+import os
+import sys
+import time
+
+from opcodetools.assembler.assembler import Assembler, ASMException
+from opcodetools.assembler.build_cache import BuildCache
+
+# py -m opcodetools.asm_watch test.asm -o test.bin -l test.lst -m test.lab.asm -d value=0x71
+# The options are the same as asm (-2, -f, -s too). Add -p 0.5 to check for changes every
+# half second (the default is 0.2).
+#
+# Assembles, then watches the source files (the main file and every include) and assembles
+# again as soon as one of them is saved. Nothing is started over between builds: the CPU
+# and its opcode index, the parsed files, the opcode matches, and the encoded lines (with
+# the symbol values they used) all stay in memory (see assembler/build_cache.py). What a
+# build no longer uses is dropped after it, so edits that move code don't pile up. A build
+# only redoes the changed files and the lines that use changed symbols.
+#
+# Errors are printed and the watch goes on. Press Ctrl-C to stop.
+
+
+def get_stats(names) -> dict:
+    '''Return the modification time and size of each file
+
+    Args:
+        names (iterable): the file names
+
+    Returns:
+        dict: name -> (time, size) or None if the file is missing
+    '''
+
+    ret = {}
+    for name in names:
+        try:
+            st = os.stat(name)
+            ret[name] = (st.st_mtime_ns, st.st_size)
+        except OSError:
+            ret[name] = None
+    return ret
+
+
+def build(name: str, cache: BuildCache, defines: dict=None, bin_name: str=None, lst_name: str=None,
+          lab_name: str=None, two_pass: bool=False, fill: int=0xFF, split: bool=False):
+    '''Assemble once and write the outputs
+
+    Args:
+        name (str): the main source file
+        cache (BuildCache): what is kept between builds
+        defines (dict): initial defines [default is None]
+        bin_name (str): the binary (or .hex or .s19) file [default is None for none]
+        lst_name (str): the listing file [default is None for none]
+        lab_name (str): the labels file [default is None for none]
+        two_pass (bool): always run the full second pass [default is False]
+        fill (int): the value for gaps between segments [default is 0xFF]
+        split (bool): write each segment to its own file [default is False]
+
+    Returns:
+        str: an error message or None if the build worked
+    '''
+
+    try:
+        a = Assembler(name, defines, cache)
+        a.assemble(two_pass)
+        if bin_name:
+            a.write_image(bin_name, fill, split)
+        if lst_name:
+            a.write_listing(lst_name)
+        if lab_name:
+            a.write_labels(lab_name)
+    except ASMException as ex:
+        return '{}\n## {}'.format(ex, ex.line)
+    except Exception as ex:
+        return str(ex)
+    return None
+
+
+def watch(name: str, interval: float=0.2, count: int=None, out=None, **options):
+    '''Build, then build again whenever a source file changes
+
+    Args:
+        name (str): the main source file
+        interval (float): seconds between checks for changes [default is 0.2]
+        count (int): stop after this many builds [default is None for never]
+        out (file): where to report each build [default is sys.stdout]
+        options: the rest of the arguments for "build"
+    '''
+
+    if out is None:
+        out = sys.stdout
+
+    cache = BuildCache()
+    stats = {}
+    builds = 0
+    while True:
+        start = time.perf_counter()
+        error = build(name, cache, **options)
+        ms = (time.perf_counter() - start) * 1000
+        builds += 1
+
+        # Watch everything this build read (and what the last one read, in case a
+        # failed build didn't get to all of its includes)
+        names = list(cache.sources)
+        if error:
+            names += [n for n in stats if n not in names]
+            out.write('## {:.0f}ms FAILED: {}\n'.format(ms, error))
+        else:
+            # Drop what this build didn't use (a failed build didn't use everything
+            # that is still good)
+            cache.prune()
+            changed = ', '.join(cache.changed) or 'no changes'
+            out.write('{:.0f}ms {} ({})\n'.format(ms, name, changed))
+        out.flush()
+
+        if count is not None and builds >= count:
+            break
+
+        # Wait for a save. The files this build read are compared with what it read
+        # (not what is there now), so a save during the build starts the next one.
+        stats = get_stats(names)
+        stats.update(cache.source_stats())
+        while get_stats(stats) == stats:
+            time.sleep(interval)
+
+
+if __name__ == '__main__':
+
+    options = {'bin_name': os.path.splitext(sys.argv[1])[0] + '.bin', 'defines': {}}
+    interval = 0.2
+    for i in range(2, len(sys.argv)):
+        if sys.argv[i].startswith('-o'):
+            options['bin_name'] = sys.argv[i + 1]
+        elif sys.argv[i].startswith('-l'):
+            options['lst_name'] = sys.argv[i + 1]
+        elif sys.argv[i].startswith('-m'):
+            options['lab_name'] = sys.argv[i + 1]
+        elif sys.argv[i].startswith('-d'):
+            key, value = sys.argv[i + 1].split('=')
+            options['defines'][key] = int(value, 0)
+        elif sys.argv[i] == '-2':
+            options['two_pass'] = True
+        elif sys.argv[i] == '-f':
+            options['fill'] = int(sys.argv[i + 1], 0)
+        elif sys.argv[i] == '-s':
+            options['split'] = True
+        elif sys.argv[i] == '-p':
+            interval = float(sys.argv[i + 1])
+
+    try:
+        watch(sys.argv[1], interval, **options)
+    except KeyboardInterrupt:
+        pass
@@ -4,12 +4,31 @@
 
 import os
 
+import opcodetools.assembler.expression
+import opcodetools.assembler.symbols
 import opcodetools.cpu.cpu_manager
+import opcodetools.utils.hexfile
 from typing import List
 
 import importlib
 
 
+# Bytes on each listing line of a tool block
+LISTING_TOOL_BYTES = 32
+
+# Size of the listing file's write buffer
+LISTING_BUFFER_SIZE = 1024 * 1024
+
+
+def _to_hex(data) -> str:
+    '''Return the hex for a list of bytes ("01 2A FF")'''
+    try:
+        return bytes(data).hex(' ').upper()
+    except ValueError:
+        # Not all bytes (a negative value, for instance)
+        return ' '.join('{:02X}'.format(d) for d in data)
+
+
 class ASMException(Exception):
     def __init__(self, message, line):
         super().__init__(message)
@@ -21,23 +40,34 @@ class Assembler:
     '''Manages labels and controls the assembly process
     '''
 
-    def __init__(self, filename: str, initdefs = None):
+    def __init__(self, filename: str, initdefs = None, cache = None):
         '''Create a new Assembler object
 
         Args:
             filename (string) name of file to assemble
+            initdefs (dict): initial defines [default is None]
+            cache (BuildCache): files, matches, and lines kept from earlier builds [default is None]
         '''
 
+        self.cache = cache
+        if cache is not None:
+            cache.start_build()
+        self.operand_names = {}  # Names used by each (scoped) operand text (for the cache)
+        self.macros = {}
         self.lines = self.load_lines(filename)
         self.code = self.remove_comments_and_blanks(self.lines)
         self.collect_labels(self.code)
-        if initdefs:
-            self.defines = initdefs
-        else:
-            self.defines = {}
-        self.labels = {}
+        self.code = self.expand_macros(self.code)
+        self.symbols = opcodetools.assembler.symbols.SymbolTable(initdefs)
+        # The table's dictionaries (for listings and external tools)
+        self.labels = self.symbols.labels
+        self.defines = self.symbols.defines
+        self.expressions = {}  # Compiled expressions by text
+        self.fixup_lines = []  # Lines that couldn't be filled in on the first pass
+        self.unsized_lines = []  # Lines that picked 1 or 2 byte forms without knowing the value
+        self.has_tools = False
+        self.redefined = False  # A define changed value (the fixups can't be patched)
         self.cpu = None        
-        self.macros = {}
 
     def load_lines(self, filename: str) -> List[dict]:
         '''Load the lines from the given file
@@ -53,6 +83,9 @@ class Assembler:
             'address'       : 0x4000
             TODO 'label'         : 'main:'
             'data'          : [1,2,3,4]            
+            'opcode_matches' : ([opcodes],[infos]) Text matches kept between passes
+            'opcode'        : (opcode,info) The picked opcode
+            'fixup'         : (scope,cpu) Set if the first pass couldn't fill in the line
             'tool_line_no'       : ...
             'tool_end_of_block'  : ... Information for an external tool
             'tool_text_of_block' : ...
@@ -69,6 +102,40 @@ class Assembler:
         absn = os.path.abspath(filename)
         basep = os.path.dirname(absn)
 
+        if self.cache is not None:
+            source = self.cache.read_source(filename, self.read_source)
+        else:
+            source = self.read_source(filename)
+
+        ret = []
+        for pos, text in source:
+            n = text
+            if n.startswith('.include'):
+                # TODO error checking/reporting
+                n = n[8:].strip()
+                n = os.path.join(basep, n)
+                try:
+                    ret = ret + self.load_lines(n)
+                except FileNotFoundError:
+                    raise ASMException('Could not find file ' + n, {'file_name': n, 'line_number': pos, 'text': text})
+                continue
+            ret.append({
+                'file_name': filename,
+                'line_number': pos,
+                'text': n
+            })
+        return ret
+
+    def read_source(self, filename: str) -> list:
+        '''Read the lines of one file (without following the includes)
+
+        Args:
+            filename (str): the name of the file
+
+        Returns:
+            list : (line number, stripped text) for each line
+        '''
+
         with open(filename, 'r') as f:
             raw_lines = f.readlines()
 
@@ -87,26 +154,7 @@ class Assembler:
                     code_lines.append(line)
             raw_lines = code_lines            
 
-        ret = []
-        pos = 0
-        for line in raw_lines:
-            pos += 1
-            n = line.strip()
-            if n.startswith('.include'):
-                # TODO error checking/reporting
-                n = n[8:].strip()
-                n = os.path.join(basep, n)
-                try:
-                    ret = ret + self.load_lines(n)
-                except FileNotFoundError:
-                    raise ASMException('Could not find file ' + n, {'file_name': n, 'line_number': pos, 'text': line})
-                continue
-            ret.append({
-                'file_name': filename,
-                'line_number': pos,
-                'text': n
-            })
-        return ret
+        return [(pos, line.strip()) for pos, line in enumerate(raw_lines, 1)]
 
     def remove_comments_and_blanks(self, lines):
         '''Make a list of code lines (no blanks, no comments)
@@ -143,6 +191,96 @@ class Assembler:
                 line['label'] = lab
                 line['text'] = n[i:].strip()                
 
+    def expand_macros(self, code):
+        '''Expand all the macros (before assembly)
+
+        Lines beginning with "#" are macro lines:
+
+        #macro NAME(a,b)   begins a macro definition
+        #  LD A,:a:        (following "#" lines are the body of the macro)
+        #NAME(1,2)         uses the macro
+
+        A definition ends at the first line that doesn't begin with "#". The expanded
+        lines follow the using line in the listing (self.lines is rebuilt in one go).
+
+        Args:
+            code (list): the code lines
+
+        Returns:
+            list: the code lines with the macros expanded (and the "#" lines removed)
+        '''
+
+        ret = []
+        expansions = {}  # id(using line) -> expanded lines
+        macro_lines = None
+
+        # Expanded lines go back on the stack so they are processed next (macros
+        # can use macros)
+        pending = list(reversed(code))
+        while pending:
+            line = pending.pop()
+            if not line['text'].startswith('#'):
+                macro_lines = None
+                ret.append(line)
+                if line['text'].startswith('.tool '):
+                    # Tool blocks are passed to the tool untouched
+                    while pending:
+                        tool_line = pending.pop()
+                        ret.append(tool_line)
+                        if tool_line['text'] == '}':
+                            break
+                continue
+
+            n = line['text'][1:].strip()
+            if n.startswith('macro '):
+                n = n[6:].strip()
+                i = n.index('(')
+                macro_name = n[:i].strip()
+                macro_args = n[i+1:-1].strip().split(',')
+                macro_lines = []
+                if macro_name in self.macros:
+                    raise ASMException('Multiply defined macro: ' + macro_name, line)
+                self.macros[macro_name] = (macro_args,macro_lines)
+            elif macro_lines is not None:
+                # we are collecting lines for a macro
+                macro_lines.append(n)
+            else:
+                # we are using a macro
+                i = n.index('(')
+                macro_name = n[:i].strip()
+                macro_args = n[i+1:-1].strip().split(',')
+                if macro_name not in self.macros:
+                    raise ASMException('Unknown macro: ' + macro_name, line)
+                macro = self.macros[macro_name]
+                body = list(macro[1])
+                for pname in macro[0]:
+                    pval = macro_args.pop(0).strip()
+                    pname = ':'+pname+':'
+                    for i in range(len(body)):
+                        body[i] = body[i].replace(pname,pval)
+                new_lines = []
+                for m in body:
+                    new_lines.append({
+                        'file_name':line['file_name'],
+                        'line_number':line['line_number'],
+                        'original_text':m,
+                        'text':m})
+                expansions[id(line)] = new_lines
+                pending.extend(reversed(new_lines))
+
+        if expansions:
+            # Put the expanded lines in the listing right after the lines that used them
+            lines = []
+            pending = list(reversed(self.lines))
+            while pending:
+                line = pending.pop()
+                lines.append(line)
+                if id(line) in expansions:
+                    pending.extend(reversed(expansions[id(line)]))
+            self.lines = lines
+
+        return ret
+
     def process_data_term(self, line, pass_number: int, cur_term: str):
         '''Process a numerical value
 
@@ -151,9 +289,17 @@ class Assembler:
             pass_number: 0 or 1
             cur_term: the term to parse
         Returns:
-            List: a list of bytes (first-pass return all 0s)
+            List: a list of bytes (first-pass return all 0s if the value isn't known yet)
 
         '''
+        if pass_number == 0:
+            # Fill in what we can on the first pass. Anything that fails (usually a
+            # forward reference) is done on the second pass.
+            try:
+                return self.process_data_term(line, 1, cur_term)
+            except Exception:
+                self.add_fixup(line)
+
         is_word = False
         if(cur_term.startswith('word ')):
             is_word = True
@@ -186,6 +332,9 @@ class Assembler:
     def process_tool(self, line, line_no, pass_number):
         # Return the next line number (allows us to consume multiple lines)
         
+        # Tools might not fill in their data until the second pass
+        self.has_tools = True
+
         if pass_number==0:
             # Find the end of the block on the first pass
             # TODO ERROR IF WE DON'T FIND IT
@@ -265,7 +414,8 @@ class Assembler:
     def parse_numeric(self, s: str):
         '''Parse a numeric expression
 
-        Uses the python eval to evalutate expressions,
+        Each expression is compiled once (see expression.py) and cached. Defines
+        take precedence over labels.
 
         Args:
             s (str): the expression
@@ -273,18 +423,31 @@ class Assembler:
         Returns:
             The evaluation value
         '''
-        if s.startswith('_'):
-            s = self.scope + s
-        # Dollar for hex is very common in assembly
-        s = s.replace('$','0x')
-        if s[0] >= '0' and s[0] <= '9':            
-            s = s.replace('.', '0') # For simple ascii art
-        # TODO the addressing mode < and > should be handled elsewhere
-        if s[0] == '<' or s[0] == '>':
-            s = s[1:]
-        z = {**self.labels, **self.defines}
-        v = eval(s, None, z)
-        return v
+        s = self.symbols.scoped_name(s)
+        fn = self.expressions.get(s)
+        if fn is None:
+            fn = opcodetools.assembler.expression.compile_expression(s)
+            self.expressions[s] = fn
+        return fn(self.symbols)
+
+    def get_operand_names(self, line) -> tuple:
+        '''Return the names an opcode line's operands use
+
+        Args:
+            line: the code line (with its picked 'opcode')
+
+        Returns:
+            tuple: the (scoped) names
+        '''
+        names = set()
+        for v in line['opcode'][1].values():
+            s = self.symbols.scoped_name(str(v))
+            ret = self.operand_names.get(s)
+            if ret is None:
+                ret = opcodetools.assembler.expression.expression_names(s)
+                self.operand_names[s] = ret
+            names.update(ret)
+        return tuple(sorted(names))
 
     def process_define(self, line, pass_number: int):
         '''Process a define
@@ -309,20 +472,76 @@ class Assembler:
         # Must be a numeric expression
         try:
             v = self.parse_numeric(v)
-            self.defines[n] = v
+            if pass_number == 0 and self.defines.get(n, v) != v:
+                # A define that changes value ... lines patched at the end would see
+                # the last value, not the one in effect where they are
+                self.redefined = True
+            self.symbols.set_define(n, v)
         except Exception:
             raise ASMException('Invalid numeric constant: ' + v, line)    
 
-    def assemble(self):
+    def add_fixup(self, line):
+        '''Note a line that couldn't be filled in on the first pass
+
+        Args:
+            line: the code line
+        '''
+        if 'fixup' not in line:
+            # Everything needed to fill it in later
+            line['fixup'] = (self.symbols.scope, self.cpu)
+            self.fixup_lines.append(line)
+
+    def patch_fixups(self):
+        '''Fill in the lines the first pass couldn't
+
+        This replaces a full second pass when the size of every line is already
+        known (see "assemble"). Only the fixup lines are encoded again.
+        '''
+        for line in self.fixup_lines:
+            self.symbols.scope, self.cpu = line['fixup']
+            if 'opcode' in line:
+                line['data'] = self.cpu.fill_in_opcode(line['text'], self, line['address'], line['opcode'], 1)
+                if self.cache is not None:
+                    self.cache.put_result(self.cpu, self.symbols, line, self.get_operand_names(line))
+            else:
+                self.process_directive_data(line, 1)
+
+    def needs_second_pass(self) -> bool:
+        '''True if the first pass left anything to fill in
+
+        The first pass fills in every value it can. The second pass is only needed
+        if something was looked up before it was defined (a forward reference), if
+        a line couldn't be filled in, or if there are tools (they might work on
+        the second pass).
+
+        Returns:
+            bool: True if the second pass must be run
+        '''
+        return bool(self.fixup_lines or self.symbols.missing or self.has_tools)
+
+    def assemble(self, two_pass: bool = False):
         '''Two-pass assembly
+
+        The second pass is skipped if the first pass resolved everything. If the
+        size of every line is known after the first pass (and no define changed
+        value along the way), the lines that need fixing up are patched instead of
+        running the second pass. Either way the binary is the same.
+
+        Args:
+            two_pass (bool): always run the full second pass [default is False]
         '''
 
         for pass_number in range(2):
 
-            self.scope = ''
+            if pass_number == 1:
+                if not self.needs_second_pass():
+                    break
+                if not two_pass and not self.unsized_lines and not self.has_tools and not self.redefined:
+                    self.patch_fixups()
+                    break
+
+            self.symbols.start_pass()
             address = 0
-            macro_lines = None
-            lines_added = 0
             
             line_no = 0
             while line_no < len(self.code):            
@@ -331,78 +550,32 @@ class Assembler:
                 # print(">>>",line)
                 line_no += 1                
                 
-                if line['text'].startswith('#'):
-                    if pass_number:
-                        continue
-                    n = line['text'][1:].strip()                                          
-                    if n.startswith('macro '):                        
-                            n = n[6:].strip()
-                            i = n.index('(')
-                            macro_name = n[:i].strip()
-                            macro_args = n[i+1:-1].strip().split(',')       
-                            macro_lines = []
-                            if macro_name in self.macros:
-                                raise ASMException('Multiply defined macro: ' + macro_name, line)
-                            self.macros[macro_name] = (macro_args,macro_lines)
-                            continue
-                    else:
-                        if macro_lines is not None:
-                            # we are collecting lines for a macro
-                            macro_lines.append(n)                            
-                            continue
-                        else:
-                            # we are using a macro   
-                            i = n.index('(')
-                            macro_name = n[:i].strip()
-                            macro_args = n[i+1:-1].strip().split(',')
-                            if macro_name not in self.macros:
-                                raise ASMException('Unknown macro: ' + macro_name, line)
-                            macro = self.macros[macro_name]                             
-                            macro_lines = list(macro[1])
-                            for pname in macro[0]:
-                                pval = macro_args.pop(0).strip()
-                                pname = ':'+pname+':'
-                                for i in range(len(macro_lines)):
-                                    macro_lines[i] = macro_lines[i].replace(pname,pval)
-                            p = line_no
-                            pi = line['line_number']
-                            pi = self.lines.index(line)
-                            for m in macro_lines:
-                                nl = {
-                                    'file_name':line['file_name'],
-                                    'line_number':line['line_number'],
-                                    'original_text':m,
-                                    'text':m}
-                                self.code.insert(p,nl)
-                                self.lines.insert(pi+1,nl)
-                                p+=1
-                                pi+=1                                
-                            continue                                                                                          
-                else:
-                    macro_lines = None                   
-                
-
                 if 'label' in line:
                     # Label (or origin)
                     n = line['label'][:-1]
                     if n.startswith('_'):                        
-                        n = self.scope + n                        
+                        n = self.symbols.scoped_name(n)
                     else:          
-                        self.scope = n
+                        self.symbols.scope = n
                     
                     if pass_number == 0:
-                        if n in self.labels or n in self.defines:
+                        if n in self.symbols:
                             raise ASMException('Multiply defined: ' + n, line)
 
-                    try:
-                        # Purely numeric? This is an "origin"
-                        a = self.parse_numeric(n)
-                        address = a       
-                        if str.isdigit(n[0]):
-                            self.scope = ''      
-                    except Exception:
-                        # Not a number ... this is a label to remember
-                        self.labels[n] = address
+                    if n.isidentifier() and n not in self.symbols:
+                        # A new name ... this is a label to remember. (Don't evaluate
+                        # it, that would look like a forward reference.)
+                        self.symbols.set_label(n, address)
+                    else:
+                        try:
+                            # Purely numeric? This is an "origin"
+                            a = self.parse_numeric(n)
+                            address = a       
+                            if str.isdigit(n[0]):
+                                self.symbols.scope = ''      
+                        except Exception:
+                            # Not a number ... this is a label to remember
+                            self.symbols.set_label(n, address)
 
                 n = line['text']
 
@@ -445,14 +618,45 @@ class Assembler:
                     if not self.cpu:
                         raise ASMException('No CPU defined', line)
 
-                    # Opcode
-                    op = self.cpu.find_opcode_for_text(n, self)
+                    # Opcode. The text match is the same in every pass, so keep it with
+                    # the line. Only the pick between 1 and 2 byte forms can change.
+                    if 'opcode_matches' not in line:
+                        if self.cache is not None:
+                            line['opcode_matches'] = self.cache.find_opcode_matches(self.cpu, line['file_name'], n)
+                        else:
+                            line['opcode_matches'] = self.cpu.find_opcode_matches(n)
+
+                    if self.cache is not None:
+                        # Same text, address, and symbol values as an earlier build?
+                        hit = self.cache.get_result(self.cpu, self.symbols, line)
+                        if hit is not None:
+                            line['opcode'], line['data'] = hit
+                            address = address + len(line['data'])
+                            continue
+
+                    possibles, possibles_info = line['opcode_matches']
+                    misses = self.symbols.misses
+                    op = self.cpu.pick_opcode_for_text(n, possibles, possibles_info, self)
                     if not op:
                         raise ASMException('Unknown opcode: ' + n, line)
+                    if pass_number == 0 and self.symbols.misses != misses:
+                        # Picked the size without knowing the value. It might change.
+                        self.unsized_lines.append(line)
+                    line['opcode'] = op
                     
                     
                     #try:
-                    line['data'] = self.cpu.fill_in_opcode(n, self, address, op, pass_number)
+                    if pass_number == 0:
+                        # Fill in what we can on the first pass
+                        try:
+                            line['data'] = self.cpu.fill_in_opcode(n, self, address, op, 1)
+                        except Exception:
+                            self.add_fixup(line)
+                            line['data'] = self.cpu.fill_in_opcode(n, self, address, op, 0)
+                    else:
+                        line['data'] = self.cpu.fill_in_opcode(n, self, address, op, pass_number)
+                    if self.cache is not None and (pass_number == 1 or 'fixup' not in line):
+                        self.cache.put_result(self.cpu, self.symbols, line, self.get_operand_names(line))
                     # TODO we don't want to supress errors from the code
                     #except Exception as f:
                     #    raise ASMException(str(f), line)
@@ -480,78 +684,198 @@ class Assembler:
                     f.write('.{:16} = 0x{:04X}\n'.format(label, self.labels[label]))
             f.write('\n')
 
+    def listing_lines(self):
+        '''Make the lines of the listing (a generator)
+
+        The hex for each line is made in one step from its bytes. The data of a tool
+        block (tile data, for instance) is listed 32 bytes to a line.
+
+        Yields:
+            str: each line of the listing (with its newline)
+        '''
+        yield '#### Labels\n'
+        for label in sorted(self.labels):
+            if not label.startswith('_'):
+                yield '{:16} = 0x{:04X}\n'.format(label, self.labels[label])
+        yield '\n'
+        yield '#### Defines\n'
+        for define in sorted(self.defines):
+            v = self.defines[define]
+            if isinstance(v, str):
+                yield '{:16} = {}\n'.format(define, v)
+            else:
+                yield '{:16} = 0x{:04X}\n'.format(define, v)
+        yield '\n'
+
+        for line in self.lines:
+            txt = line['text']
+            if '.tool' in txt:
+                addr = line['address']
+                data = line.get('data', ())
+                for pos in range(0, len(data), LISTING_TOOL_BYTES):
+                    yield '{:04X}: {}\n'.format(addr + pos, _to_hex(data[pos:pos + LISTING_TOOL_BYTES]))
+                continue
+
+            addr = ''
+            if 'address' in line:
+                addr = '{:04X}:'.format(line['address'])
+            data = ''
+            if 'data' in line:
+                data = _to_hex(line['data'])
+            if 'original_text' in line:
+                txt = line['original_text']
+            yield '{} {:16} {}\n'.format(addr, data, txt)
+
     def write_listing(self, fname):
         '''Write the listing file
 
+        The lines are streamed through a large write buffer (see "listing_lines").
+
         Args:
             fname : the filename to create
         '''
-        with open(fname, 'w') as f:
-            f.write('#### Labels\n')
-            keys = self.labels.keys()
-            keys = sorted(keys)
-            for label in keys:
-                if not label.startswith('_'):
-                    f.write('{:16} = 0x{:04X}\n'.format(label, self.labels[label]))
-            f.write('\n')
-            f.write('#### Defines\n')
-            keys = self.defines.keys()
-            keys = sorted(keys)
-            for define in keys:
-                v = self.defines[define]
-                if isinstance(v, str):
-                    f.write('{:16} = {}\n'.format(define, v))
-                else:
-                    f.write('{:16} = 0x{:04X}\n'.format(define, v))
-            f.write('\n')
+        with open(fname, 'w', buffering=LISTING_BUFFER_SIZE) as f:
+            f.writelines(self.listing_lines())
 
-            for line in self.lines:
-                if '.tool' in line['text']:
-                    pos = 0
-                    addr = line['address']
-                    for d in line['data']:
-                        if pos == 0:
-                            f.write('{:04X}:'.format(addr))
-                        f.write(' {:02X}'.format(d))
-                        pos += 1
-                        if pos==32:
-                            f.write('\n')
-                            pos = 0
-                            addr+=32
-                    if pos:
-                        f.write('\n')
-                else:
-                    addr = ''
-                    if 'address' in line:
-                        addr = '{:04X}:'.format(line['address'])
-                    data = ''
-                    if 'data' in line:
-                        for d in line['data']:
-                            data = data + '{:02X} '.format(d)
-                    data = data.strip()
-                    txt = line['text']
-                    if 'original_text' in line:
-                        txt = line['original_text']
-                    f.write('{} {:16} {}\n'.format(addr, data, txt))
-
-    def write_binary(self, name):
+    def get_segments(self):
+        '''Collect the assembled data into contiguous segments
+
+        Each segment is a run of data with no gaps. A new segment starts wherever
+        the origin jumps ahead.
+
+        Returns:
+            list: (origin, bytearray) for each segment in address order
+        '''
+        segments = []
+        end = None
+        for line in self.lines:
+            if 'data' in line and line['data']:
+                new_org = line['address']
+                if end is not None and new_org < end:
+                    raise Exception(f'Origin problems {hex(end)} {hex(new_org)}')
+                if new_org != end:
+                    segments.append((new_org, bytearray()))
+                segments[-1][1].extend(line['data'])
+                end = new_org + len(line['data'])
+        return segments
+
+    def write_binary(self, name, fill: int = 0xFF, split: bool = False):
         '''Write the binary file
 
+        The gaps between segments are filled with the fill byte. With "split" each
+        segment is written to its own file named for its origin (test.bin becomes
+        test_8000.bin, test_FFFA.bin, and so on) and nothing is filled.
+
         Args:
-            fname : the filename to create
+            name : the filename to create
+            fill (int): the value for gaps between segments [default is 0xFF]
+            split (bool): write each segment to its own file [default is False]
+        Returns:
+            list: the names of the files written
         '''
+        segments = self.get_segments()
+
+        if split:
+            names = []
+            for org, data in segments:
+                seg_name = self.get_segment_name(name, org)
+                with open(seg_name, 'wb') as f:
+                    f.write(data)
+                names.append(seg_name)
+            return names
+
+        # The image starts at the first line with an address (even if it has no data)
+        org = None
         for line in self.lines:
             if 'address' in line:
                 org = line['address']
                 break
         with open(name, 'wb') as f:
-            for line in self.lines:
-                if 'data' in line and line['data']:
-                    new_org = line['address']
-                    if new_org < org:
-                        raise Exception(f'Origin problems {hex(org)} {hex(new_org)}')
-                    while org < new_org:
-                        f.write(bytearray([0xFF]))
-                        org = org + 1
-                    f.write(bytearray(line['data']))
-                    org = org + len(bytearray(line['data']))
+            for new_org, data in segments:
+                if new_org < org:
+                    raise Exception(f'Origin problems {hex(org)} {hex(new_org)}')
+                if new_org > org:
+                    f.write(bytes([fill]) * (new_org - org))
+                f.write(data)
+                org = new_org + len(data)
+        return [name]
+
+    def get_segment_name(self, name, org: int) -> str:
+        '''Return the file name for one segment of a split output
+
+        Args:
+            name : the output filename (test.bin)
+            org (int): the segment's origin
+        Returns:
+            str: the segment's filename (test_8000.bin)
+        '''
+        base, ext = os.path.splitext(name)
+        return '{}_{:04X}{}'.format(base, org, ext)
+
+    def write_intel_hex(self, name, record_size: int = 16, split: bool = False):
+        '''Write the segments to an Intel HEX file (the gaps are skipped)
+
+        With "split" each segment is written to its own file, named the same way as
+        "write_binary" names them.
+
+        Args:
+            name : the filename to create
+            record_size (int): data bytes in each record [default is 16]
+            split (bool): write each segment to its own file [default is False]
+        Returns:
+            list: the names of the files written
+        '''
+        segments = self.get_segments()
+        if not split:
+            opcodetools.utils.hexfile.write_intel_hex(name, segments, record_size)
+            return [name]
+        names = []
+        for org, data in segments:
+            seg_name = self.get_segment_name(name, org)
+            opcodetools.utils.hexfile.write_intel_hex(seg_name, [(org, data)], record_size)
+            names.append(seg_name)
+        return names
+
+    def write_srecord(self, name, record_size: int = 16, split: bool = False):
+        '''Write the segments to a Motorola S-record file (the gaps are skipped)
+
+        With "split" each segment is written to its own file, named the same way as
+        "write_binary" names them.
+
+        Args:
+            name : the filename to create
+            record_size (int): data bytes in each record [default is 16]
+            split (bool): write each segment to its own file [default is False]
+        Returns:
+            list: the names of the files written
+        '''
+        segments = self.get_segments()
+        if not split:
+            opcodetools.utils.hexfile.write_srecord(name, segments, record_size, os.path.basename(name))
+            return [name]
+        names = []
+        for org, data in segments:
+            seg_name = self.get_segment_name(name, org)
+            opcodetools.utils.hexfile.write_srecord(seg_name, [(org, data)], record_size, os.path.basename(seg_name))
+            names.append(seg_name)
+        return names
+
+    def write_image(self, name, fill: int = 0xFF, split: bool = False):
+        '''Write the assembled image in the format given by the file extension
+
+        ".hex" (or ".ihx") is Intel HEX and ".s19" (".s28", ".s37", ".srec", ".mot") is
+        a Motorola S-record. Anything else is a raw binary (see "write_binary").
+
+        Args:
+            name : the filename to create
+            fill (int): the value for gaps between segments (raw binary) [default is 0xFF]
+            split (bool): write each segment to its own file [default is False]
+        Returns:
+            list: the names of the files written
+        '''
+        ext = os.path.splitext(name)[1].lower()
+        if ext in opcodetools.utils.hexfile.HEX_EXTENSIONS:
+            return self.write_intel_hex(name, split=split)
+        if ext in opcodetools.utils.hexfile.SRECORD_EXTENSIONS:
+            return self.write_srecord(name, split=split)
+        return self.write_binary(name, fill, split)
@@ -0,0 +1,307 @@
+import hashlib
+import marshal
+import os
+import sys
+import zlib
+
+from opcodetools.cpu import table_cache
+
+'''
+  A build cache for assembling the same project over and over.
+
+  For every source file (the main file and each include) the cache keeps:
+
+    'stat'    : (modification time, size) when the file was last read
+    'hash'    : a hash of the file's contents
+    'lines'   : the parsed lines ((line number, stripped text) ... see Assembler.read_source)
+    'matches' : CPU key -> line text -> (opcode indexes, substitution infos)
+    'results' : (CPU key, scope, line text, address) -> (pick, data, names, values)
+
+  Matching a line's text against the opcode table is most of the work of assembling, and
+  it depends only on the text. The matches are kept as indexes into the CPU's opcode
+  list (the CPU key is the opcode table's cache key plus the matching and encoding
+  code ... see get_cpu_key).
+
+  The results are the encoded bytes of each opcode line along with the symbols its
+  operands used and their values. The bytes depend only on the text, the address (and
+  scope), and those values. A rebuild reuses them for every line where all of these are
+  the same, so only the lines in changed files and the lines that use changed symbols
+  are encoded again.
+
+  Unchanged files (same time and size, or same contents) are not parsed again. Entries
+  for the lines that are gone are dropped by "prune" (and when the cache is saved).
+
+  The cache file lives in a "build" directory in the table cache directory and is named
+  for the main source file. It is also keyed by the assembler's own source, so changes
+  to the assembler never see old results.
+'''
+
+CACHE_VERSION = 1
+
+# Results are only good for the code that made them (the CPU's own module is in the
+# CPU key)
+_ASSEMBLER_MODULES = ['opcodetools.assembler.assembler', 'opcodetools.assembler.expression',
+                      'opcodetools.assembler.symbols', 'opcodetools.assembler.build_cache',
+                      'opcodetools.cpu.base_assembly']
+
+# The modules that match and encode a CPU's lines (see get_cpu_key)
+_CPU_MODULES = ['opcodetools.cpu.base_assembly', 'opcodetools.assembler.build_cache']
+
+
+def _get_build_path(filename: str):
+    '''Return the cache file for a main source file (or None if caching is off)'''
+
+    d = table_cache.get_cache_dir(True)
+    if not d:
+        return None
+    crc = zlib.crc32(os.path.abspath(filename).encode())
+    for name in _ASSEMBLER_MODULES:
+        fname = getattr(sys.modules.get(name), '__file__', None)
+        if not fname:
+            return None
+        try:
+            with open(fname, 'rb') as f:
+                crc = zlib.crc32(f.read(), crc)
+        except OSError:
+            return None
+    return os.path.join(d, 'build', '{}-{}-{:08x}.marshal'.format(
+        os.path.basename(filename), CACHE_VERSION, crc))
+
+
+class BuildCache:
+
+    '''Parsed files, opcode matches, and encoded lines kept between builds'''
+
+    def __init__(self, filename: str=None):
+        '''Create the cache (and load what earlier builds saved)
+
+        Args:
+            filename (str): the main source file (None to keep the cache in memory only)
+        '''
+
+        self.path = _get_build_path(filename) if filename else None
+        self.files = {}
+        self.sources = []  # The files of the current build
+        self.changed = []  # The files read again in the current build
+        self._used = set()  # (file, line text) for the lines of the current build
+        self._used_results = set()  # (file, result key) for the lines of the current build
+        self._file_keys = {}
+        self._results_by_name = {}
+        self._cpu_keys = {}
+        self._indexes = {}
+
+        if self.path:
+            try:
+                with open(self.path, 'rb') as f:
+                    self.files = marshal.loads(f.read())
+            except Exception:
+                # Missing or damaged ... start empty
+                pass
+
+    def start_build(self):
+        '''Forget what the last build read (call before each build)'''
+
+        self.sources = []
+        self.changed = []
+        self._used = set()
+        self._used_results = set()
+
+    def read_source(self, filename: str, read) -> list:
+        '''Return the parsed lines of a source file (parsing it only if it changed)
+
+        Args:
+            filename (str): the file
+            read (function): parses the file (see Assembler.read_source)
+
+        Returns:
+            list: (line number, text) for each line
+        '''
+
+        key = self._file_key(filename)
+        self.sources.append(filename)
+        st = os.stat(filename)
+        stat = (st.st_mtime_ns, st.st_size)
+        entry = self.files.get(key)
+        if entry is not None and entry['stat'] == stat:
+            return entry['lines']
+
+        with open(filename, 'rb') as f:
+            digest = hashlib.sha1(f.read()).hexdigest()
+        if entry is not None and entry['hash'] == digest:
+            entry['stat'] = stat
+            return entry['lines']
+
+        lines = read(filename)
+        if entry is None:
+            entry = {'matches': {}, 'results': {}}
+            self.files[key] = entry
+        entry['stat'] = stat
+        entry['hash'] = digest
+        entry['lines'] = lines
+        self.changed.append(filename)
+        return lines
+
+    def source_stats(self) -> dict:
+        '''Return the (modification time, size) of each file of the current build
+
+        These are the stats from when the build read the files, so a file saved while
+        the build was running doesn't match them.
+
+        Returns:
+            dict: name -> (time, size)
+        '''
+
+        return {name: self.files[self._file_key(name)]['stat'] for name in self.sources}
+
+    def _file_key(self, filename: str) -> str:
+        key = self._file_keys.get(filename)
+        if key is None:
+            key = os.path.abspath(filename)
+            self._file_keys[filename] = key
+        return key
+
+    def _entry(self, filename: str) -> dict:
+        key = self._file_key(filename)
+        entry = self.files.get(key)
+        if entry is None:
+            # Not read through the cache (lines made by a tool, for instance)
+            entry = {'stat': None, 'hash': None, 'lines': [], 'matches': {}, 'results': {}}
+            self.files[key] = entry
+        return entry
+
+    def _results(self, filename: str) -> tuple:
+        hit = self._results_by_name.get(filename)
+        if hit is None:
+            hit = (self._file_key(filename), self._entry(filename)['results'])
+            self._results_by_name[filename] = hit
+        return hit
+
+    def get_cpu_key(self, cpu) -> str:
+        '''Return the key for a CPU's matches and results
+
+        This is the opcode table's key (see table_cache.get_table_key) extended with the
+        modules that match and encode the lines, so editing the CPU's module or any of
+        these never reuses old matches or bytes.
+        '''
+
+        key = self._cpu_keys.get(cpu)
+        if key is None:
+            key = table_cache.get_table_key(cpu, _CPU_MODULES) or type(cpu).__name__
+            self._cpu_keys[cpu] = key
+            self._indexes[cpu] = {op: i for i, op in enumerate(cpu._opcodes)}
+        return key
+
+    def find_opcode_matches(self, cpu, filename: str, text: str):
+        '''Find the opcodes that match a line of text (see BaseAssembly.find_opcode_matches)
+
+        Args:
+            cpu (CPU): the CPU
+            filename (str): the file the line is in
+            text (str): the line of code
+
+        Returns:
+            tuple: (list of opcodes, list of substitution infos)
+        '''
+
+        self._used.add((self._file_key(filename), text))
+        matches = self._entry(filename)['matches'].setdefault(self.get_cpu_key(cpu), {})
+        hit = matches.get(text)
+        if hit is not None:
+            opcodes = cpu._opcodes
+            return [opcodes[i] for i in hit[0]], list(hit[1])
+
+        possibles, possibles_info = cpu.find_opcode_matches(text)
+        indexes = self._indexes[cpu]
+        matches[text] = (tuple(indexes[op] for op in possibles), tuple(possibles_info))
+        return possibles, possibles_info
+
+    def get_result(self, cpu, symbols, line: dict):
+        '''Return the encoding of an opcode line from an earlier build
+
+        Args:
+            cpu (CPU): the CPU
+            symbols (SymbolTable): the symbols as they are now
+            line (dict): the line (with its 'address' and 'opcode_matches')
+
+        Returns:
+            tuple: ((opcode, info), data) or None if the line must be encoded
+        '''
+
+        file_key, results = self._results(line['file_name'])
+        key = (self.get_cpu_key(cpu), symbols.scope, line['text'], line['address'])
+        hit = results.get(key)
+        if hit is None:
+            return None
+        pick, data, names, values = hit
+        defines = symbols.defines
+        labels = symbols.labels
+        for name, value in zip(names, values):
+            v = defines.get(name, labels)
+            if v is labels:
+                v = labels.get(name, labels)
+            if v != value:
+                return None
+        self._used_results.add((file_key, key))
+        possibles, possibles_info = line['opcode_matches']
+        return (possibles[pick], possibles_info[pick]), list(data)
+
+    def put_result(self, cpu, symbols, line: dict, names: tuple):
+        '''Remember the encoding of an opcode line
+
+        Args:
+            cpu (CPU): the CPU
+            symbols (SymbolTable): the symbols used to encode the line
+            line (dict): the encoded line
+            names (tuple): the (scoped) names the line's operands use
+        '''
+
+        values = []
+        for name in names:
+            if name not in symbols:
+                # Not known yet ... nothing to keep
+                return
+            values.append(symbols.defines.get(name, symbols.labels.get(name)))
+        possibles, possibles_info = line['opcode_matches']
+        opcode, info = line['opcode']
+        for pick in range(len(possibles)):
+            if possibles[pick] is opcode and possibles_info[pick] is info:
+                break
+        else:
+            return
+        file_key, results = self._results(line['file_name'])
+        key = (self.get_cpu_key(cpu), symbols.scope, line['text'], line['address'])
+        results[key] = (pick, tuple(line['data']), names, tuple(values))
+        self._used_results.add((file_key, key))
+
+    def prune(self):
+        '''Drop the matches and results the last build didn't use
+
+        Results are keyed by address, so every edit that moves code leaves old entries
+        behind. Call this after each build when the cache is kept in memory.
+        '''
+
+        for key, entry in self.files.items():
+            for matches in entry['matches'].values():
+                for text in [t for t in matches if (key, t) not in self._used]:
+                    del matches[text]
+            results = entry['results']
+            for rkey in [k for k in results if (key, k) not in self._used_results]:
+                del results[rkey]
+
+    def save(self):
+        '''Drop the entries the last build didn't use and save the cache file
+
+        Failing to write the file is not an error (the next build just does more work).
+        '''
+
+        self.prune()
+        if not self.path:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp = self.path + '.' + str(os.getpid())
+            with open(tmp, 'wb') as f:
+                f.write(marshal.dumps(self.files))
+            os.replace(tmp, self.path)
+        except (OSError, ValueError):
+            pass
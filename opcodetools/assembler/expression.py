@@ -0,0 +1,145 @@
+import ast
+import operator
+
+'''
+  Numeric expressions are parsed once (with Python's own parser) and turned into a tree
+  of small closures. Evaluating an expression is then just calling the closure with the
+  symbol table. Nothing is compiled or merged on each use.
+
+  The text rewrites are the same the assembler has always done:
+    - "$" means hex ("$1F" is "0x1F")
+    - a leading digit turns "." into "0" (simple ascii art: "1..1" is "1001")
+    - a leading "<" or ">" (the addressing mode) is dropped
+
+  Names are looked up in the symbol table. Unknown names raise NameError just like eval.
+'''
+
+_BIN_OPS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv,
+    ast.Mod: operator.mod,
+    ast.Pow: operator.pow,
+    ast.LShift: operator.lshift,
+    ast.RShift: operator.rshift,
+    ast.BitAnd: operator.and_,
+    ast.BitOr: operator.or_,
+    ast.BitXor: operator.xor,
+}
+
+_UNARY_OPS = {
+    ast.UAdd: operator.pos,
+    ast.USub: operator.neg,
+    ast.Invert: operator.invert,
+    ast.Not: operator.not_,
+}
+
+_COMPARE_OPS = {
+    ast.Eq: operator.eq,
+    ast.NotEq: operator.ne,
+    ast.Lt: operator.lt,
+    ast.LtE: operator.le,
+    ast.Gt: operator.gt,
+    ast.GtE: operator.ge,
+}
+
+
+def rewrite_expression(s: str) -> str:
+    '''Apply the assembler's text rewrites to an expression
+
+    Args:
+        s (str): the expression as written
+
+    Returns:
+        str: the expression as Python syntax
+    '''
+
+    # Dollar for hex is very common in assembly
+    s = s.replace('$', '0x')
+    if s[0] >= '0' and s[0] <= '9':
+        s = s.replace('.', '0')  # For simple ascii art
+    # TODO the addressing mode < and > should be handled elsewhere
+    if s[0] == '<' or s[0] == '>':
+        s = s[1:]
+    return s
+
+
+def _compile_node(node):
+    '''Turn one AST node into a closure (or None if we don't handle it)'''
+
+    if isinstance(node, ast.Constant):
+        value = node.value
+        return lambda symbols: value
+
+    if isinstance(node, ast.Name):
+        name = node.id
+
+        def lookup(symbols):
+            try:
+                return symbols[name]
+            except KeyError:
+                raise NameError(f"name '{name}' is not defined") from None
+        return lookup
+
+    if isinstance(node, ast.BinOp) and type(node.op) in _BIN_OPS:
+        fn = _BIN_OPS[type(node.op)]
+        left = _compile_node(node.left)
+        right = _compile_node(node.right)
+        if left is None or right is None:
+            return None
+        return lambda symbols: fn(left(symbols), right(symbols))
+
+    if isinstance(node, ast.UnaryOp) and type(node.op) in _UNARY_OPS:
+        fn = _UNARY_OPS[type(node.op)]
+        operand = _compile_node(node.operand)
+        if operand is None:
+            return None
+        return lambda symbols: fn(operand(symbols))
+
+    if isinstance(node, ast.Compare) and len(node.ops) == 1 and type(node.ops[0]) in _COMPARE_OPS:
+        fn = _COMPARE_OPS[type(node.ops[0])]
+        left = _compile_node(node.left)
+        right = _compile_node(node.comparators[0])
+        if left is None or right is None:
+            return None
+        return lambda symbols: fn(left(symbols), right(symbols))
+
+    return None
+
+
+def compile_expression(s: str):
+    '''Compile an expression into a function of the symbol table
+
+    Anything beyond plain arithmetic (function calls and such) still goes to
+    Python's eval, but it is compiled only once.
+
+    Args:
+        s (str): the expression as written
+
+    Returns:
+        function: takes the symbol table (a mapping) and returns the value
+    '''
+
+    s = rewrite_expression(s)
+    tree = ast.parse(s.strip(), mode='eval')
+    fn = _compile_node(tree.body)
+    if fn is None:
+        code = compile(tree, '<expression>', 'eval')
+        fn = lambda symbols: eval(code, {}, symbols)
+    return fn
+
+
+def expression_names(s: str) -> tuple:
+    '''Return the names an expression looks up
+
+    Args:
+        s (str): the expression as written
+
+    Returns:
+        tuple: the names (sorted, no repeats)
+    '''
+
+    tree = ast.parse(rewrite_expression(s).strip(), mode='eval')
+    return tuple(sorted({node.id for node in ast.walk(tree) if isinstance(node, ast.Name)}))
@@ -0,0 +1,74 @@
+import sys
+
+
+class SymbolTable:
+
+    '''Labels, defines and the current scope in one place
+
+    The table is a mapping (name -> value) so expressions can look names up
+    directly. Defines take precedence over labels.
+
+    Every lookup of a name that isn't defined (yet) is remembered. A name that
+    is missed and then defined later is a forward reference. If a pass finishes
+    with no misses at all, every value it used was already final.
+    '''
+
+    def __init__(self, defines: dict = None):
+        '''Create a new symbol table
+
+        Args:
+            defines (dict): initial defines (from the command line)
+        '''
+
+        self.labels = {}
+        self.defines = {}
+        if defines:
+            for name in defines:
+                self.set_define(name, defines[name])
+        self.scope = ''
+        self.missing = set()  # Names looked up before they were defined
+        self.misses = 0  # Count of lookups that missed (watch this to see if a step missed)
+
+    def start_pass(self):
+        '''Reset the per-pass state (scope and misses)'''
+
+        self.scope = ''
+        self.missing = set()
+
+    def scoped_name(self, name: str) -> str:
+        '''Apply the current scope to a local ("_") name
+
+        Args:
+            name (str): the name as written
+
+        Returns:
+            str: the full (interned) name
+        '''
+
+        if name.startswith('_'):
+            name = self.scope + name
+        return sys.intern(name)
+
+    def set_label(self, name: str, value: int):
+        self.labels[sys.intern(name)] = value
+
+    def set_define(self, name: str, value):
+        self.defines[sys.intern(name)] = value
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.defines or name in self.labels
+
+    def __getitem__(self, name: str):
+        v = self.defines.get(name, self)
+        if v is self:
+            v = self.labels.get(name, self)
+            if v is self:
+                self.missing.add(name)
+                self.misses += 1
+                raise KeyError(name)
+        return v
+
+    def get(self, name: str, default=None):
+        if name in self:
+            return self[name]
+        return default
@@ -1,3 +1,5 @@
+from opcodetools.cpu.opcode import USE_PCR, USE_S2
+
 
 class AssemblyException(Exception):
     pass
@@ -9,10 +11,12 @@ class BaseAssembly:
     def init_assembly(self):
         '''Initialize the CPU to begin assembly
 
-        This might be expensive. Don't do it until we know we need to.
+        This might be expensive. Don't do it until we know we need to. It is only done once
+        for each CPU (the CPUs are shared by every assembly in the process).
         '''
 
-        self.make_frags()
+        if getattr(self, '_frag_index', None) is None:
+            self.make_frags()
 
     def make_frags(self):
         '''Make opcode fragments for assembly
@@ -21,6 +25,8 @@ class BaseAssembly:
 
         This method fills out the fragments for all opcodes. We assume that single lower-case
         letters represent things needing filled in.
+
+        It also indexes the opcodes by the first word of the mnemonic (see "find_opcode_candidates").
         '''
 
         for op in self._opcodes:
@@ -37,6 +43,57 @@ class BaseAssembly:
                 else:
                     op.frags[-1] = op.frags[-1] + c
 
+        self.make_frag_index()
+
+    def make_frag_index(self):
+        '''Index the opcodes by the first word of the mnemonic
+
+        A line of text can only match an opcode if the text starts with the opcode's first
+        fragment. When that fragment ends a word (a space follows or it is the whole
+        mnemonic), the line's first word must equal the opcode's first word.
+
+        The few opcodes that can't be keyed this way are added to every list (and kept on
+        their own for words we have never seen). All lists are in opcode-table order.
+        '''
+
+        self._frag_index = {}
+        self._frag_unindexed = []
+        for op in self._opcodes:
+            first = op.frags[0]
+            i = first.find(' ')
+            if i >= 0:
+                key = first[:i]
+            elif len(op.frags) == 1:
+                key = first
+            else:
+                self._frag_unindexed.append(op)
+                continue
+            if key not in self._frag_index:
+                self._frag_index[key] = []
+            self._frag_index[key].append(op)
+
+        if self._frag_unindexed:
+            order = {id(op): i for i, op in enumerate(self._opcodes)}
+            for key in self._frag_index:
+                ops = self._frag_index[key] + self._frag_unindexed
+                self._frag_index[key] = sorted(ops, key=lambda op: order[id(op)])
+
+    def find_opcode_candidates(self, nmatch: str) -> list:
+        '''Return the opcodes that might match the (normalized) text
+
+        Args:
+            nmatch (str): the text with unneeded whitespace removed
+
+        Returns:
+            list: the possible opcodes in opcode-table order
+        '''
+
+        nmatch = nmatch.upper()
+        i = nmatch.find(' ')
+        if i >= 0:
+            nmatch = nmatch[:i]
+        return self._frag_index.get(nmatch, self._frag_unindexed)
+
     def remove_unneeded_whitespace(self, text: str):
         '''Remove unneeded whitespace from a string
 
@@ -78,6 +135,22 @@ class BaseAssembly:
             Opcode: the requested (opcode,info) (or None)
         '''
 
+        possibles, possibles_info = self.find_opcode_matches(text)
+        return self.pick_opcode_for_text(text, possibles, possibles_info, assembler)
+
+    def find_opcode_matches(self, text: str):
+        '''Find all the opcodes that match this line of text equally well
+
+        This depends only on the text, so the result can be kept and reused across
+        assembler passes. Use "pick_opcode_for_text" to choose between them.
+
+        Args:
+            text (str): the line of code
+
+        Returns:
+            tuple: (list of opcodes, list of substitution info for each)
+        '''
+
         # Ignorable whitespace
         nmatch = self.remove_unneeded_whitespace(text)
 
@@ -86,7 +159,7 @@ class BaseAssembly:
         possibles = []
         possibles_info = []
         longest_first_frag = 0
-        for op in self._opcodes:
+        for op in self.find_opcode_candidates(nmatch):
             remain = nmatch                    
             info = {}
             for fi in range(len(op.frags)):
@@ -147,6 +220,24 @@ class BaseAssembly:
                 del possibles[i]
                 del possibles_info[i]
 
+        return possibles, possibles_info
+
+    def pick_opcode_for_text(self, text: str, possibles: list, possibles_info: list, assembler):
+        '''Pick the one opcode from the matches found by "find_opcode_matches"
+
+        With more than one match the choice might depend on the value of the
+        operand (one or two byte addressing).
+
+        Args:
+            text (str): the line of code
+            possibles (list): the matching opcodes
+            possibles_info (list): the substitution info for each opcode
+            assembler (Assembler): contains any defines
+
+        Returns:
+            Opcode: the requested (opcode,info) (or None)
+        '''
+
         n = len(possibles)
 
         if n == 0:
@@ -193,11 +284,7 @@ class BaseAssembly:
                     sz = 2
 
             for i in range(len(possibles) - 1, -1, -1):
-                cnt = 0
-                for f in possibles[i].code:
-                    if isinstance(f, str):
-                        cnt += 1
-                if cnt == sz:
+                if possibles[i].fill_count == sz:
                     # The Z80 includes repeats like 2A and ED6B. TODO: fix this
                     return(possibles[i], possibles_info[i])
 
@@ -210,7 +297,7 @@ class BaseAssembly:
         for p in possibles:
             if p.mnemonic != g.mnemonic:
                 raise AssemblyException('Multiple Matches')
-        return(possibles[i], possibles_info[i])
+        return(possibles[0], possibles_info[0])
 
     def fill_in_opcode(self, _text, asm, address, op, pass_number):
         '''
@@ -221,18 +308,19 @@ class BaseAssembly:
         if pass_number == 0:
             return [0] * len(opcode.code)
         else:
+            # The info might be kept for the next pass ... don't change it
+            values = {}
             for key in info:
-                val = asm.parse_numeric(str(info[key]))
-                info[key] = [info[key], val]
+                values[key] = asm.parse_numeric(str(info[key]))
             ret = []
             for c in opcode.code:
                 if isinstance(c, str):
-                    numval = info[c[0]][1]
-                    if 's2' in opcode.use[c[0]]:
+                    numval = values[c[0]]
+                    if opcode.use_mask[c[0]] & USE_S2:
                         sz = 2
                     else:
                         sz = 1
-                    if 'pcr' in opcode.use[key]:
+                    if opcode.use_mask[key] & USE_PCR:
                         numval = numval - address - len(opcode.code)
                         if sz == 2:
                             if numval < -32768 or numval > 32767:
@@ -1,6 +1,7 @@
 import opcodetools.cpu.base_assembly
 import opcodetools.cpu.base_disassembly
 import opcodetools.cpu.opcode
+import opcodetools.cpu.table_cache
 
 '''
   The CPU class is a list of individual opcodes. An opcode has several parts:
@@ -92,21 +93,44 @@ class CPU(opcodetools.cpu.base_assembly.BaseAssembly, opcodetools.cpu.base_disas
         '''
 
         self.little_endian = little_endian
-        self._opcodes = []
         self._opcodes_info = opcodes
-        self._quick_codes = {}  # Helps in searching for large opcode lists
-        for op in opcodes:
-            #print('##',op)
-            opc = self.make_opcode(op)
+
+        # Parsing the tables (and building the decode trie) is slow. Use the cached
+        # results if we have them.
+        cached = opcodetools.cpu.table_cache.load_table(self)
+        if cached:
+            self._opcodes, self._decode_root = cached
+        else:
+            self._opcodes = []
+            for op in self.expand_opcodes(opcodes):
+                #print('##',op)
+                opc = self.make_opcode(op)
+                self._opcodes.append(opc)
+                if not isinstance(opc.code[0], int):
+                    raise CPUException('First code byte must be a number')
+            # Every disassembly needs the decode trie
+            self.init_disassembly()
+            opcodetools.cpu.table_cache.save_table(self, self._opcodes, self._decode_root)
+
+        for opc in self._opcodes:
             opc._cpu = self
-            self._opcodes.append(opc)
-            key = opc.code[0]
-            if not isinstance(key, int):
-                raise CPUException('First code byte must be a number')
-            if key in self._quick_codes:
-                self._quick_codes[key].append(opc)
-            else:
-                self._quick_codes[key] = [opc]
+
+        # Operand decoders and line templates are made as each opcode is first disassembled
+        self._operand_decoders = {}
+        self._line_templates = {}
+
+    def expand_opcodes(self, opcodes: list) -> list:
+        '''Expand the opcode table entries before they are parsed
+
+        Specific CPUs can override this to generate entries (the 6809 post-bytes
+        for instance). The results are cached with the parsed opcodes.
+
+        Args:
+            opcodes (list): the opcode table entries
+        Returns:
+            list: the entries to parse
+        '''
+        return opcodes
 
     def make_opcode(self, info: dict) -> opcodetools.cpu.opcode.Opcode:
         '''Create an opcode from the given info.
@@ -1,10 +1,51 @@
-from opcodetools.cpu.opcode import Opcode
+from opcodetools.cpu.opcode import Opcode, USE_CODE, USE_DATA, USE_PCR, USE_PORT, USE_R, USE_RW, USE_S1, USE_W
+
+# Access kinds for cross references (bits). No READ or WRITE means the direction isn't known.
+XREF_READ = 1
+XREF_WRITE = 2
+XREF_CODE = 4  # Jump, branch, or call
+XREF_PORT = 8  # An I/O port (not memory)
+
+
+# The decode trie is made of plain lists (so it can be cached with marshal). Each node is:
+#   [fixed, wild, ends]
+# Fixed opcode bytes branch through "fixed" (a dict keyed on the byte value). Fill-in
+# bytes match any value and branch through "wild" (a node or None). "ends" lists the
+# opcode-table indexes of the opcodes that end at this depth.
+_FIXED = 0
+_WILD = 1
+_ENDS = 2
 
 
 class BaseDisassembly:
 
+    # For code-flow disassembly (see disassembler/codeflow.py). Specific CPUs fill these in.
+    CODE_FLOW_ENDS = set()  # Mnemonics that never fall through to the next instruction
+    ENTRY_POINTS = []  # Addresses where code starts (reset, interrupts)
+    VECTORS = []  # Addresses of (two byte) pointers to code
+
     def init_disassembly(self):
-        pass
+        '''Build the decode trie from the opcode list
+
+        Every opcode is threaded through the trie one byte at a time. A lookup then walks
+        the binary once instead of testing every opcode that shares a first byte.
+        '''
+
+        self._decode_root = [{}, None, []]
+        for index, opc in enumerate(self._opcodes):
+            node = self._decode_root
+            for c, fixed in zip(opc.code, opc.fixed_mask):
+                if not fixed:
+                    if node[_WILD] is None:
+                        node[_WILD] = [{}, None, []]
+                    node = node[_WILD]
+                else:
+                    child = node[_FIXED].get(c)
+                    if child is None:
+                        child = [{}, None, []]
+                        node[_FIXED][c] = child
+                    node = child
+            node[_ENDS].append(index)
 
     def get_field_spacing(self):
         '''Return the field spacing for disassembly
@@ -35,31 +76,109 @@ class BaseDisassembly:
         v = hex(opvalue)[2:].upper().rjust(2, '0')
         return s + ': ' + v + ' ; ????'
 
-    def binary_to_string(self, opcode: Opcode, binary: list, address: int, fills: dict):
-        '''Make a disassembly string from the given info
+    def binary_to_string_data(self, address: int, data: bytes):
+        '''Make a disassembly string for data bytes (in the assembler's data syntax)
+
+        Args:
+            address (int): the address of the first byte
+            data (bytes): the data bytes
+        Returns:
+            str: the string to print
+        '''
+
+        spa = self.get_field_spacing()
+        fs = '{:0' + str(spa['address_size']) + 'X}: {:<' + str(spa['data']) + '}. {}'
+        return fs.format(address, data.hex(' ').upper() + ' ', ','.join('0x{:02X}'.format(v) for v in data))
+
+    def ends_code_flow(self, opcode: Opcode, fills: dict) -> bool:
+        '''True if the instruction never falls through to the next one (jumps and returns)
 
         Args:
             opcode (Opcode): the opcode
-            address (int): the address of the opcode
-            binary (list): the opcode data
-            fills (dict): the opcode fill-in information
+            fills (dict): the opcode's fill-ins (see get_mnemonic_fills)
+        Returns:
+            bool: True if the flow ends here
+        '''
+
+        return opcode.mnemonic in self.CODE_FLOW_ENDS
 
+    def get_code_targets(self, opcode: Opcode, address: int, fills: dict) -> dict:
+        '''Return the code addresses an instruction can jump (or call) to
+
+        These are the "code" fill-ins that aren't read or written as data and aren't
+        indirect (a pointer to the target isn't the target).
+
+        Args:
+            opcode (Opcode): the opcode
+            address (int): the address of the instruction
+            fills (dict): the opcode's fill-ins (see get_mnemonic_fills)
         Returns:
-            The complete disassembly string
+            dict: fill-in letter -> target address
         '''
-        
-        # Spacing for the disassembly fields
-        spa = self.get_field_spacing()
 
-        # Address
-        fs = '{:0' + str(spa['address_size']) + 'X}'
-        add = fs.format(address)
+        targets = {}
+        mnemonic = opcode.mnemonic
+        for letter, use in opcode.use_mask.items():
+            if use & USE_CODE and not use & (USE_R | USE_W | USE_RW) and letter in fills:
+                i = mnemonic.find(letter)
+                if i > 0 and mnemonic[i - 1] in '([':
+                    continue
+                fill = fills[letter]
+                if use & USE_PCR:
+                    targets[letter] = fill['relative_target']
+                else:
+                    targets[letter] = fill['numeric_value']
+        return targets
 
-        # Data
-        ds = ''
-        for i in range(len(binary)):
-            ds = ds + '{:02X} '.format(binary[i])
-        ds = ds.ljust(spa['data'], ' ')
+    def get_references(self, opcode: Opcode, address: int, fills: dict) -> dict:
+        '''Return the addresses an instruction uses (for cross references)
+
+        These are the code targets (see "get_code_targets") and the "data", "port", and
+        "code" fill-ins used as addresses. Constants aren't addresses.
+
+        Args:
+            opcode (Opcode): the opcode
+            address (int): the address of the instruction
+            fills (dict): the opcode's fill-ins (see get_mnemonic_fills)
+        Returns:
+            dict: fill-in letter -> (address, access kind XREF_*)
+        '''
+
+        refs = {}
+        targets = self.get_code_targets(opcode, address, fills)
+        for letter, use in opcode.use_mask.items():
+            if letter in targets:
+                refs[letter] = (targets[letter], XREF_CODE)
+            elif use & (USE_DATA | USE_PORT | USE_CODE) and letter in fills:
+                kind = 0
+                if use & (USE_R | USE_RW):
+                    kind |= XREF_READ
+                if use & (USE_W | USE_RW):
+                    kind |= XREF_WRITE
+                if use & USE_PORT:
+                    kind |= XREF_PORT
+                elif use & USE_CODE and not kind:
+                    # A pointer to code (like "JMP (t)") is read
+                    kind = XREF_READ
+                fill = fills[letter]
+                refs[letter] = (fill.get('relative_target', fill['numeric_value']), kind)
+        return refs
+
+    def make_line_template(self, opcode: Opcode):
+        '''Make the output template for an opcode's disassembly lines
+
+        The template has fixed slots for the address, the data bytes, and each fill-in
+        letter in the (already spaced out) mnemonic. Rendering a line is one format call.
+
+        Args:
+            opcode (Opcode): the opcode
+
+        Returns:
+            tuple: (format function, fill-in letters in the mnemonic)
+        '''
+
+        # Spacing for the disassembly fields
+        spa = self.get_field_spacing()
 
         # Multi-word mnemonic spacing
         # TODO: use however many words are in the array ... or just the one if it isn't an array
@@ -72,17 +191,50 @@ class BaseDisassembly:
         else:
             mn = mn.ljust(spa['mnemonic'][0] + spa['mnemonic'][1])
 
-        # Build the basic form
-        base = f'{add}: {ds}{mn}'
-        
-        for f in fills:
-            fill_info = fills[f]
-            i = base.find(f)
-            if i >= 0:
-                # TODO: visible spacing
-                base = base.replace(f, fill_info['sub_value'])
+        parts = []
+        for c in mn:
+            if c.islower():
+                # A fill-in slot
+                parts.append('{' + c + '}')
+            elif c == '{' or c == '}':
+                parts.append(c + c)
+            else:
+                parts.append(c)
+        fmt = '{:0' + str(spa['address_size']) + 'X}: {:<' + str(spa['data']) + '}' + ''.join(parts)
+        letters = tuple(dict.fromkeys(c for c in mn if c.islower()))
+        return fmt.format, letters
+
+    def binary_to_string(self, opcode: Opcode, binary: list, address: int, fills: dict, offset: int=0):
+        '''Make a disassembly string from the given info
+
+        Args:
+            opcode (Opcode): the opcode
+            address (int): the address of the opcode
+            binary (list): the opcode data (or a larger buffer holding it)
+            fills (dict): the opcode fill-in information
+            offset (int): where the opcode starts in the binary [default is 0]
 
-        return base
+        Returns:
+            The complete disassembly string
+        '''
+
+        template = self._line_templates.get(opcode)
+        if template is None:
+            template = self.make_line_template(opcode)
+            self._line_templates[opcode] = template
+        fmt, letters = template
+
+        # Data (just the opcode's bytes ... never the rest of the buffer)
+        data = bytes(binary[offset:offset + len(opcode.code)])
+        ds = data.hex(' ').upper() + ' ' if data else ''
+
+        # Letters without a fill-in are left as they are
+        subs = {}
+        for f in letters:
+            fill_info = fills.get(f)
+            subs[f] = fill_info['sub_value'] if fill_info else f
+
+        return fmt(address, ds, **subs)
 
     def binary_to_string_fill(self, address: int, binary: list, opcode: Opcode, fills: dict, ind: int):
         '''Fill in an opcode data value
@@ -129,8 +281,9 @@ class BaseDisassembly:
         # New substitution string
         fs = '${:0' + str(entry['visual_size'] - 1) + 'X}'
 
-        if 'pcr' in opcode.use[spec[0]]:
-            if 's1' in opcode.use[spec[0]]:
+        use = opcode.use_mask[spec[0]]
+        if use & USE_PCR:
+            if use & USE_S1:
                 # One byte relative (from start of next instruction)
                 fa = address + len(opcode.code)
                 if val < 0x80:
@@ -150,19 +303,104 @@ class BaseDisassembly:
 
         entry['sub_value'] = fs.format(val)
 
-    def get_mnemonic_fills(self, opcode: Opcode, binary: list, address: int):
+    def make_operand_decoder(self, opcode: Opcode):
+        '''Make a function that decodes all of an opcode's fill-ins in one step
+
+        Everything about each fill-in (which bytes, their order and weight, the display
+        width, and the signed PC-relative math) is worked out here once. The function
+        just reads the bytes and returns the same fills that "binary_to_string_fill"
+        would make one byte at a time.
+
+        CPUs with their own fill-ins should override this to return None for those
+        opcodes (see the 6809).
+
+        Args:
+            opcode (Opcode): the opcode
+
+        Returns:
+            function: (binary, offset, address) -> fills dict (or None to use "binary_to_string_fill")
+        '''
+
+        if type(self).binary_to_string_fill is not BaseDisassembly.binary_to_string_fill and \
+                type(self).make_operand_decoder is BaseDisassembly.make_operand_decoder:
+            # This CPU has its own fill-in code that we don't know about
+            return None
+
+        code = opcode.code
+        size = len(code)
+        fields = []
+        for letter in dict.fromkeys(c[0] for c in code if c.__class__ is str):
+            # The bytes of this fill-in and the weight of each (the "1" byte is the high byte)
+            parts = tuple((i, 256 if c[1] == '1' else 1) for i, c in enumerate(code)
+                          if c.__class__ is str and c[0] == letter)
+            visual_size = 5 if any(mul == 256 for _, mul in parts) else 3
+            fmt = ('${:0' + str(visual_size - 1) + 'X}').format
+            use = opcode.use_mask[letter]
+            if not use & USE_PCR:
+                relative = None
+            elif use & USE_S1:
+                relative = (0x80, 0x100)
+            else:
+                relative = (0x8000, 0x10000)
+            fields.append((letter, parts, visual_size, fmt, relative))
+
+        if len(fields) == 1 and len(fields[0][1]) == 1 and not fields[0][4]:
+            # By far the most common: one plain byte
+            letter, ((ind, _),), visual_size, fmt, _ = fields[0]
+
+            def decode_byte(binary, offset, address):
+                val = binary[offset + ind]
+                return {letter: {'sub_value': fmt(val), 'visual_size': visual_size, 'numeric_value': val}}
+
+            return decode_byte
+
+        def decode(binary, offset, address):
+            fills = {}
+            for letter, parts, visual_size, fmt, relative in fields:
+                val = 0
+                for i, mul in parts:
+                    val += binary[offset + i] * mul
+                if relative:
+                    # Relative to the start of the next instruction
+                    if val < relative[0]:
+                        fa = address + size + val
+                    else:
+                        fa = address + size + val - relative[1]
+                    fills[letter] = {'sub_value': fmt(fa), 'visual_size': visual_size,
+                                     'numeric_value': val, 'relative_target': fa}
+                else:
+                    fills[letter] = {'sub_value': fmt(val), 'visual_size': visual_size,
+                                     'numeric_value': val}
+            return fills
+
+        return decode
+
+    def get_mnemonic_fills(self, opcode: Opcode, binary: list, address: int, offset: int=0):
         '''Get all the fill-in information for a given opcode
 
         Args:
             opcode (Opcode): the opcode
             address (int): the address of the opcode
-            binary (list): the binary data for the opcode
+            binary (list): the binary data for the opcode (or a larger buffer holding it)
+            offset (int): where the opcode starts in the binary [default is 0]
 
         Returns:
             dict: all the fill ins
         '''
 
         code = opcode.code
+        if not opcode.fill_count:
+            return {}
+
+        decoder = self._operand_decoders.get(opcode, self)
+        if decoder is self:
+            decoder = self.make_operand_decoder(opcode)
+            self._operand_decoders[opcode] = decoder
+        if decoder is not None and offset + len(code) <= len(binary):
+            return decoder(binary, offset, address)
+
+        # Just the opcode's bytes (never the rest of the buffer)
+        binary = binary[offset:offset + len(code)]
         fills = {}
         for i in range(len(binary)):
             g = code[i]
@@ -172,49 +410,50 @@ class BaseDisassembly:
         
         return fills
 
-    def find_opcodes_for_binary(self, binary: list, exact: bool=False, hint=None) -> list:
+    def find_opcodes_for_binary(self, binary: list, exact: bool=False, hint=None, offset: int=0) -> list:
         '''Find the opcodes that match the binary (a disassembly operation)
 
         If the match is not and exact match, the the binary can include lots of extra
         bytes (since we don't know exactly how many until we find the match).
 
+        The binary is never copied. Pass the whole image and an offset to decode from the
+        middle of it.
+
         Args:
             binary (list[int]): the bytes to disassemble
-            start (int): starting point in the bytes [default is 0]
             exact (bool): True if the opcode must match the given bytes exactly [default is False]
+            hint (str): prefer the opcode whose mnemonic starts with this [default is None]
+            offset (int): starting point in the bytes [default is 0]
         Returns:
             list[Opcode]: The opcodes information
         '''
 
         end = len(binary)
 
-        if not end:
-            return []
-
-        if not binary[0] in self._quick_codes:
-            return []
-
-        possible = self._quick_codes[binary[0]]
-
-        ret = []
-
-        for oc in possible:
-            if exact and len(oc.code) != end:
-                continue
-            code = oc.code
-            could_be = True
-            for b in range(len(code)):
-                if b >= end:
-                    could_be = False
-                    break
-                if isinstance(code[b], str):
-                    # Matches anything
-                    continue
-                if code[b] != binary[b]:
-                    could_be = False
-                    break
-            if could_be:
-                ret.append(oc)
+        # Walk the trie. Fixed and fill-in edges can both match the same byte, so more
+        # than one path might be live at a time.
+        found = []
+        nodes = [self._decode_root]
+        depth = offset
+        while nodes and depth < end:
+            value = binary[depth]
+            live = []
+            for node in nodes:
+                child = node[_FIXED].get(value)
+                if child is not None:
+                    live.append(child)
+                if node[_WILD] is not None:
+                    live.append(node[_WILD])
+            nodes = live
+            depth += 1
+            if not exact or depth == end:
+                for node in nodes:
+                    found.extend(node[_ENDS])
+
+        # Back in opcode-table order (first match wins)
+        found.sort()
+        opcodes = self._opcodes
+        ret = [opcodes[i] for i in found]
 
         if ret and len(ret)>1:
             if hint:
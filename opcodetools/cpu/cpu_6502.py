@@ -158,5 +158,8 @@ OPCODES = [
 
 class CPU_6502(opcodetools.cpu.base_cpu.CPU):
 
+    CODE_FLOW_ENDS = {'JMP t', 'JMP (t)', 'RTS', 'RTI'}
+    VECTORS = [0xFFFA, 0xFFFC, 0xFFFE]
+
     def __init__(self):
         super().__init__(OPCODES)
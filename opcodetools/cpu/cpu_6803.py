@@ -231,5 +231,8 @@ OPCODES = [
 
 class CPU_6803(opcodetools.cpu.base_cpu.CPU):
 
+    CODE_FLOW_ENDS = {'JMP t', 'JMP i,X', 'BRA r', 'RTS', 'RTI'}
+    VECTORS = [0xFFF0, 0xFFF2, 0xFFF4, 0xFFF6, 0xFFF8, 0xFFFA, 0xFFFC, 0xFFFE]
+
     def __init__(self):
         super().__init__(OPCODES)
@@ -523,6 +523,10 @@ class CPU_6809(opcodetools.cpu.base_cpu.CPU):
     REG_PAIR_WORD = ['D', 'X', 'Y', 'U', 'X', 'PC','?','?']
     REG_PAIR_BYTE = ['A', 'B', 'CC', 'DP','?','?','?','?']
 
+    # Every JMP mode ends the flow too (see ends_code_flow)
+    CODE_FLOW_ENDS = {'BRA r', 'LBRA s', 'RTS', 'RTI'}
+    VECTORS = [0xFFF2, 0xFFF4, 0xFFF6, 0xFFF8, 0xFFFA, 0xFFFC, 0xFFFE]
+
     @staticmethod
     def _register_pair(value):
         a = (value>>4)&0x0F
@@ -554,11 +558,14 @@ class CPU_6809(opcodetools.cpu.base_cpu.CPU):
         return ','.join(regs)
 
     def __init__(self):
+        super().__init__(OPCODES, False)
+
+    def expand_opcodes(self, opcodes):
 
         expanded_opcodes = []
 
         # Expand the "post" mnemonics
-        for entry in OPCODES:
+        for entry in opcodes:
             if 'y' in entry['mnemonic']:
                 for post in POSTS:
                     new_mnem = entry['mnemonic'].replace('y', post['post'])
@@ -572,7 +579,38 @@ class CPU_6809(opcodetools.cpu.base_cpu.CPU):
             else:
                 expanded_opcodes.append(entry)
 
-        super().__init__(expanded_opcodes, False)
+        return expanded_opcodes
+
+    def make_operand_decoder(self, opcode: Opcode):
+        # The register lists and pairs are decoded in "binary_to_string_fill"
+        for letter in 'xquvz':
+            if letter in opcode.use:
+                return None
+        return super().make_operand_decoder(opcode)
+
+    def ends_code_flow(self, opcode: Opcode, fills: dict) -> bool:
+        if opcode.mnemonic.startswith('JMP '):
+            return True
+        if 'q' in fills or 'v' in fills:
+            # PULS/PULU with PC is a return
+            regs = fills.get('q', fills.get('v'))['sub_value']
+            return 'PC' in regs.split(',')
+        return super().ends_code_flow(opcode, fills)
+
+    def get_code_targets(self, opcode: Opcode, address: int, fills: dict) -> dict:
+        for letter in fills:
+            if letter in opcode.use and 'bp' in opcode.use[letter]:
+                # The upper byte is in the DP register (we don't know it)
+                return {}
+        return super().get_code_targets(opcode, address, fills)
+
+    def get_references(self, opcode: Opcode, address: int, fills: dict) -> dict:
+        refs = super().get_references(opcode, address, fills)
+        for letter in list(refs):
+            if 'bp' in opcode.use[letter]:
+                # The upper byte is in the DP register (we don't know it)
+                del refs[letter]
+        return refs
 
     def binary_to_string_fill(self, address: int, binary: list, opcode: Opcode, fills: dict, ind: int):
         # Used for disassembly
@@ -278,5 +278,24 @@ OPCODES = [
 
 class CPU_8052(opcodetools.cpu.base_cpu.CPU):
 
+    CODE_FLOW_ENDS = {'AJMP p', 'LJMP t', 'SJMP r', 'JMP @A+DPTR', 'RET', 'RETI'}
+    ENTRY_POINTS = [0x0000, 0x0003, 0x000B, 0x0013, 0x001B, 0x0023, 0x002B]
+
     def __init__(self):
         super().__init__(OPCODES)
+
+    def get_code_targets(self, opcode, address: int, fills: dict) -> dict:
+        if 'p' in opcode.use and '11' in opcode.use['p']:
+            # AJMP/ACALL: 11 bit address in the 2K page of the next instruction (the
+            # upper 3 bits are in the opcode)
+            page = (address + 2) & 0xF800
+            return {'p': page | ((opcode.code[0] >> 5) << 8) | fills['p']['numeric_value']}
+        return super().get_code_targets(opcode, address, fills)
+
+    def get_references(self, opcode, address: int, fills: dict) -> dict:
+        refs = super().get_references(opcode, address, fills)
+        for letter in list(refs):
+            if 'bit' in opcode.use[letter]:
+                # Bit addresses aren't byte addresses
+                del refs[letter]
+        return refs
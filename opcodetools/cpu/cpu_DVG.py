@@ -44,11 +44,11 @@ class CPU_DVG(opcodetools.cpu.base_cpu.CPU):
             
         super().__init__(self._dvg_copcodes)
             
-    def find_opcodes_for_binary(self, binary: list, exact: bool=False, hint=None) -> list:
+    def find_opcodes_for_binary(self, binary: list, exact: bool=False, hint=None, offset: int=0) -> list:
         
         if not exact:
             raise Exception('Still working on a generic DVG disassembler')
         
-        leading = binary[1] >> 4
+        leading = binary[offset + 1] >> 4
         return [ self._opcodes[leading] ]
     
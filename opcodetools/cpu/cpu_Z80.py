@@ -742,5 +742,8 @@ OPCODES = [
 
 class CPU_Z80(opcodetools.cpu.base_cpu.CPU):
 
+    CODE_FLOW_ENDS = {'JP t', 'JP (HL)', 'JP (IX)', 'JP (IY)', 'JR r', 'RET', 'RETI', 'RETN'}
+    ENTRY_POINTS = [0x0000, 0x0008, 0x0010, 0x0018, 0x0020, 0x0028, 0x0030, 0x0038, 0x0066]
+
     def __init__(self):
         super().__init__(OPCODES)
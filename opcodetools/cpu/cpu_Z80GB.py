@@ -524,5 +524,8 @@ OPCODES = [
 
 class CPU_Z80GB(opcodetools.cpu.base_cpu.CPU):
 
+    CODE_FLOW_ENDS = {'JP t', 'JP (HL)', 'JR r', 'RET', 'RETI'}
+    ENTRY_POINTS = [0x0000, 0x0008, 0x0010, 0x0018, 0x0020, 0x0028, 0x0030, 0x0038, 0x0040, 0x0048, 0x0050, 0x0058, 0x0060, 0x0100]
+
     def __init__(self):
         super().__init__(OPCODES)
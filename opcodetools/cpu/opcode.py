@@ -1,38 +1,131 @@
+import sys
+
+'''
+  The use qualifiers (see base_cpu) are kept as bits in an int so the hot paths can test
+  them with a single "&" instead of searching a list of strings. The common ones have
+  fixed bits below. Any other qualifier a CPU table uses gets the next free bit.
+'''
+
+USE_BITS = {}
+
+
+def use_bit(name: str) -> int:
+    '''Return the bit for a use qualifier (making a new one if needed)
+
+    Args:
+        name (str): the qualifier ("pcr", "s1", "code", ...)
+    Returns:
+        int: the bit mask
+    '''
+    bit = USE_BITS.get(name)
+    if bit is None:
+        bit = 1 << len(USE_BITS)
+        USE_BITS[sys.intern(name)] = bit
+    return bit
+
+
+USE_CONST = use_bit('const')
+USE_SCONST = use_bit('sconst')
+USE_DATA = use_bit('data')
+USE_CODE = use_bit('code')
+USE_PORT = use_bit('port')
+USE_R = use_bit('r')
+USE_W = use_bit('w')
+USE_RW = use_bit('rw')
+USE_PCR = use_bit('pcr')
+USE_S1 = use_bit('s1')
+USE_S2 = use_bit('s2')
+
+# Many opcodes have the same uses and the same fill-in layout. They all share one copy.
+_shared_uses = {}  # use items -> (use, use_mask)
+_shared_masks = {}  # fixed_mask -> fixed_mask
+
+
+def _get_use_mask(specs: tuple) -> int:
+    mask = 0
+    for spec in specs:
+        mask |= use_bit(spec)
+    return mask
+
+
 class Opcode():
 
     '''All the information about a single opcode
 
-    Opcodes objects are super-simple. They are just structures.
+    Opcodes objects are super-simple. They are just structures. There are thousands of
+    them in the bigger tables, so they use slots and tuples.
+
+      code        tuple of fixed byte values (int) and fill-in specs ("a0", "a1", "pp")
+      use         fill-in letter -> tuple of use qualifiers ("code", "pcr", "s1")
+      use_mask    fill-in letter -> the use qualifiers as bits (USE_PCR, ...)
+      fixed_mask  per byte: 0xFF for a fixed byte, 0 for a fill-in byte
+      fill_count  the number of fill-in bytes
     '''
 
+    __slots__ = ('cpu', '_cpu', 'frags', 'info', 'mnemonic', 'code', 'use',
+                 'use_mask', 'fixed_mask', 'fill_count')
+
     def __init__(self, info: dict):
         self.cpu = None
         self.frags = None  # For assembly
         self.info = info
         self.mnemonic = info['mnemonic']
-        self.code = []
-        code = info['code']
+        code = []
         cts = {}  # Byte sizes for each spec
-        for i in range(0, len(code), 2):
-            frag = code[i:i + 2]
+        info_code = info['code']
+        for i in range(0, len(info_code), 2):
+            frag = info_code[i:i + 2]
             if frag.islower():
-                self.code.append(frag)
+                code.append(sys.intern(frag))
                 if not frag[0] in cts:
                     cts[frag[0]] = 1
                 else:
                     cts[frag[0]] += 1
             else:
-                self.code.append(int(frag, 16))
-        self.use = {}
-        use = info['use']
-        if use:
-            use = use.split(',')
-            for u in use:
+                code.append(int(frag, 16))
+        use = {}
+        info_use = info['use']
+        if info_use:
+            info_use = info_use.split(',')
+            for u in info_use:
                 i = u.index('=')
                 sp = u[:i].strip()
                 specs = u[i + 1:].strip().split('_')
                 specs.append('s' + str(cts[sp]))
-                self.use[sp] = specs
+                use[sys.intern(sp)] = tuple(sys.intern(s) for s in specs)
+        self._set_code(tuple(code), use)
+
+    @classmethod
+    def from_table_entry(cls, info: dict, code: tuple, use: dict):
+        '''Make an opcode from an already parsed entry (see table_cache)
+
+        Args:
+            info (dict): the opcode information
+            code (tuple): the parsed code (numbers and fill-in specs)
+            use (dict): the parsed uses for each fill-in
+        Returns:
+            Opcode: the opcode
+        '''
+        op = cls.__new__(cls)
+        op.cpu = None
+        op.frags = None
+        op.info = info
+        op.mnemonic = info['mnemonic']
+        op._set_code(code, use)
+        return op
+
+    def _set_code(self, code: tuple, use: dict):
+        '''Set the parsed code and uses along with everything derived from them'''
+        self.code = code
+        key = tuple(use.items())
+        shared = _shared_uses.get(key)
+        if shared is None:
+            shared = (use, {sp: _get_use_mask(specs) for sp, specs in use.items()})
+            _shared_uses[key] = shared
+        self.use, self.use_mask = shared
+        mask = tuple([0 if c.__class__ is str else 0xFF for c in code])
+        self.fixed_mask = _shared_masks.setdefault(mask, mask)
+        self.fill_count = mask.count(0)
 
     def __repr__(self):
         return f'OPCODE {self.mnemonic}'
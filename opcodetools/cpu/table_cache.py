@@ -0,0 +1,186 @@
+import marshal
+import os
+import sys
+import zlib
+
+from opcodetools.cpu.opcode import Opcode
+
+'''
+  Parsing the opcode tables (and expanding the 6809 post-bytes) is a large part of a
+  CPU's start up time. The parsed tables are saved to a cache file the first time a CPU
+  is built. Later runs load the file instead.
+
+  The file is a marshal of four columns: the info entries, the parsed codes, the parsed
+  uses, and the decode trie (plain lists and dicts of opcode indexes). marshal is built
+  in (no import cost) and loads plain containers quickly. The Opcode objects are made
+  directly from the columns without any parsing.
+
+  The cache key is a checksum of the CPU's module source (the tables and any expansion
+  code) and of the modules that parse the tables. Edit any of these and the old cache
+  entry is simply never found again.
+
+  The cache is off unless the OPCODETOOLS_CACHE environment variable names a directory
+  for it. Nothing is read or written otherwise. Writing a new entry for a CPU deletes
+  that CPU's older entries, so edits and upgrades don't leave files behind.
+
+  The "-i" caches of asm and dasm use the same directory. They are asked for on the
+  command line, so they fall back to ~/.cache/opcodetools when OPCODETOOLS_CACHE isn't
+  set (an empty OPCODETOOLS_CACHE turns them off too).
+
+  Build every CPU's cache ahead of time with:
+      py -m opcodetools.cpu.table_cache
+'''
+
+CACHE_VERSION = 1
+
+# The modules that turn table entries into opcodes (and build the trie)
+_BASE_MODULES = ['opcodetools.cpu.base_cpu', 'opcodetools.cpu.base_disassembly', 'opcodetools.cpu.opcode']
+
+
+def get_cache_dir(default: bool=False):
+    '''Return the cache directory (or None if caching is off)
+
+    Args:
+        default (bool): True to use ~/.cache/opcodetools when OPCODETOOLS_CACHE isn't set
+                        [default is False for no cache]
+
+    Returns:
+        str: the directory or None
+    '''
+
+    d = os.environ.get('OPCODETOOLS_CACHE')
+    if d is None and default:
+        d = os.path.join(os.path.expanduser('~'), '.cache', 'opcodetools')
+    return d or None
+
+
+def get_table_key(cpu, modules=()):
+    '''Return the cache key for a CPU's opcode table
+
+    The key names the CPU and changes whenever the CPU's module or the modules that
+    parse its tables change. Other caches that hold opcode indexes use it as their CPU
+    key (add the modules that make their own results).
+
+    Args:
+        cpu (CPU): the CPU
+        modules (iterable): more module names to include in the key [default is none]
+
+    Returns:
+        str: the key (or None if a module's source can't be read)
+    '''
+
+    crc = zlib.crc32(type(cpu).__qualname__.encode())
+    size = 0
+    for name in [type(cpu).__module__] + _BASE_MODULES + list(modules):
+        fname = getattr(sys.modules.get(name), '__file__', None)
+        if not fname:
+            return None
+        try:
+            with open(fname, 'rb') as f:
+                data = f.read()
+        except OSError:
+            return None
+        crc = zlib.crc32(data, crc)
+        size += len(data)
+    return '{}-{}-{:08x}-{:x}'.format(type(cpu).__name__, CACHE_VERSION, crc, size)
+
+
+def _get_table_path(cpu):
+    '''Return the cache file for the CPU (or None if it can't be cached)'''
+
+    d = get_cache_dir()
+    if not d:
+        return None
+    key = get_table_key(cpu)
+    if not key:
+        return None
+    return os.path.join(d, key + '.marshal')
+
+
+def load_table(cpu):
+    '''Load the cached opcode table for a CPU
+
+    Args:
+        cpu (CPU): the CPU being built
+
+    Returns:
+        tuple: (parsed opcodes, decode trie) or None if there is no cache entry
+    '''
+
+    path = _get_table_path(cpu)
+    if not path:
+        return None
+    try:
+        with open(path, 'rb') as f:
+            infos, codes, uses, trie = marshal.loads(f.read())
+    except Exception:
+        # Missing or damaged ... just build the table
+        return None
+    make = Opcode.from_table_entry
+    return [make(info, code, use) for info, code, use in zip(infos, codes, uses)], trie
+
+
+def save_table(cpu, opcodes, trie):
+    '''Save the opcode table for a CPU to the cache
+
+    Only plain Opcode objects are cached (not the results of a custom "make_opcode").
+    The CPU's older cache files (from before an edit or an upgrade) are deleted. Failing
+    to write the cache (a read-only directory, for instance) is not an error.
+
+    Args:
+        cpu (CPU): the CPU being built
+        opcodes (list): the parsed opcodes
+        trie (list): the decode trie built from the opcodes
+    '''
+
+    for op in opcodes:
+        if type(op) is not Opcode:
+            return
+    path = _get_table_path(cpu)
+    if not path:
+        return
+    columns = ([op.info for op in opcodes], [op.code for op in opcodes], [op.use for op in opcodes], trie)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = path + '.' + str(os.getpid())
+        with open(tmp, 'wb') as f:
+            f.write(marshal.dumps(columns))
+        os.replace(tmp, path)
+    except (OSError, ValueError):
+        # ValueError: something in an info entry that marshal can't store
+        return
+    _remove_old_tables(path, type(cpu).__name__)
+
+
+def _remove_old_tables(path: str, cpu_name: str):
+    '''Delete the CPU's cache files other than the one just written'''
+
+    d, keep = os.path.split(path)
+    prefix = cpu_name + '-'
+    try:
+        names = os.listdir(d)
+    except OSError:
+        return
+    for name in names:
+        # The prefix ends with "-" so CPU_Z80 doesn't match CPU_Z80GB
+        if name != keep and name.startswith(prefix) and name.endswith('.marshal'):
+            try:
+                os.remove(os.path.join(d, name))
+            except OSError:
+                pass
+
+
+if __name__ == '__main__':
+
+    import time
+
+    from opcodetools.cpu import cpu_manager
+
+    if not get_cache_dir():
+        print('Set OPCODETOOLS_CACHE to the cache directory first')
+        sys.exit(1)
+
+    for name in ['6502', '6803', '6809', '8052', 'DVG', 'Z80', 'Z80GB']:
+        start = time.perf_counter()
+        cpu_manager.get_cpu_by_name(name)
+        print('{:6} {:8.1f}ms'.format(name, (time.perf_counter() - start) * 1000))
@@ -2,42 +2,126 @@ import sys
 
 from opcodetools.utils import binary
 from opcodetools.cpu import cpu_manager
-
-arg_parse = sys.argv
+from opcodetools.disassembler.codeflow import disassemble_code_flow
+from opcodetools.disassembler.decode_cache import DecodeCache
+from opcodetools.disassembler.disassembler import disassemble, disassemble_parallel, write_lines
+from opcodetools.disassembler.labels import collect_labels, label_lines
+from opcodetools.disassembler.xref import build_xref, write_xref
 
 # py dasm Z80 1000 "a.bin+b.bin+c.bin"
+# Add -j 4 to spread a big image over 4 processes (-j 0 for one per core)
+# Add -c to follow the code flow from the CPU's entry points and vectors (the rest is data)
+# Add -e C000 (as many as needed) to follow the code flow from these entry points
+# Add -i to keep the decoded instructions on disk so reruns only decode what changed (implies -c)
+# Add -l to make labels for the code targets (and use them in the operands)
+# Add -x xref.txt to write the cross references (who reads, writes, or jumps to each address)
 #arg_parse = ['','Z80GB','0','d:/git/gbc-sea-hunt/dmg_boot.bin']
 #arg_parse = ['','6809','C000','d:/git/computerarcheology/content/coco/doubleback/roms/doubleback.bin']
 #arg_parse = ['','6809','8000','d:/git/computerarcheology/content/arcade/digdug2/roms/main.bin']
 #arg_parse = ['','Z80','0','d:/git/computerarcheology/content/arcade/phoenix/roms/maincpu.bin']
 
-cpuname = arg_parse[1]
-org = int(arg_parse[2], 16)
-names = arg_parse[3]
 
-bindata = binary.load_binary(names)
+def disassemble_files(cpuname: str, org: int, names: str, out=None, workers: int=1,
+                      code_flow: bool=False, entries: list=None, labels: bool=False, xref_name: str=None,
+                      incremental: bool=False):
+    '''Disassemble one or more files (the library version of this script)
+
+    Args:
+        cpuname (str): the CPU name
+        org (int): the origin
+        names (str): the files ("a.bin+b.bin" or "a.bin@8000+b.bin@C000")
+        out (file): where to write [default is sys.stdout]
+        workers (int): number of processes (None for one per core) [default is 1]
+        code_flow (bool): True to follow the code flow instead of a linear sweep [default is False]
+        entries (list): entry points for the code flow (plus the CPU's own) [default is None]
+        labels (bool): True to add labels for the code targets [default is False]
+        xref_name (str): file for the cross references [default is None for none]
+        incremental (bool): True to load and save the code flow's decode cache (implies code_flow) [default is False]
+
+    Returns:
+        int: the number of lines of disassembly
+    '''
+
+    if out is None:
+        out = sys.stdout
+
+    bindata = binary.load_binary(names, org)
+
+    cpu = cpu_manager.get_cpu_by_name(cpuname)
+    if not cpu:
+        raise ValueError('Unknown CPU ' + cpuname)
+
+    out.write('; CPU: ' + cpuname + '\n')
+    out.write('; ORIGIN: ' + hex(org) + '\n')
+    out.write('; FILES: ' + names + '\n')
+    out.write('\n')
+
+    # An incremental run reuses (and saves) the instructions decoded by earlier runs
+    code_flow = code_flow or bool(entries) or incremental
+    cache = None
+    if incremental:
+        cache = DecodeCache(cpu, bindata, org)
+
+    # The image is decoded in place (a cursor into bindata) and the lines are written
+    # in big chunks as they are made.
+    def make_lines():
+        if records is not None:
+            return records
+        if code_flow:
+            return disassemble_code_flow(cpu, bindata, org, list(cpu.ENTRY_POINTS) + (entries or []), cache=cache)
+        if workers == 1 or labels or xref_name:
+            # The workers don't send back the opcodes (needed for labels and references)
+            return disassemble(cpu, bindata, org)
+        return disassemble_parallel(cpuname, bindata, org, workers)
+
+    # A linear sweep is made again for each pass over it (nothing is held in memory).
+    # The code flow is traced once and its records are kept for the labels, the cross
+    # references, and the output.
+    records = None
+    if code_flow and (labels or xref_name):
+        records = list(make_lines())
+
+    lines = make_lines()
+    if labels:
+        # Two passes over the disassembly (one to find the labels)
+        lines = label_lines(cpu, make_lines(), collect_labels(cpu, lines))
+    count = write_lines(lines, out)
+
+    if xref_name:
+        spa = cpu.get_field_spacing()
+        with open(xref_name, 'w') as f:
+            write_xref(build_xref(cpu, make_lines()), f, spa['address_size'])
 
-cpu = cpu_manager.get_cpu_by_name(cpuname)
+    if cache is not None:
+        cache.save()
 
-print('; CPU:', cpuname)
-print('; ORIGIN:', hex(org))
-print('; FILES:', names)
-print()
+    return count
 
-pos = 0
 
-while pos < len(bindata):
-    ops = cpu.find_opcodes_for_binary(bindata[pos:])
-    if len(ops) != 1:
-        print(cpu.binary_to_string_unknown(pos + org, bindata[pos]))
-        pos += 1
-        continue
+if __name__ == '__main__':
 
-    opc = ops[0]
+    arg_parse = sys.argv
 
-    dat = bindata[pos:pos + len(opc.code)]
-    fills = cpu.get_mnemonic_fills(ops[0], dat, pos + org)
-    s = cpu.binary_to_string(opc, dat, pos + org, fills)
-    pos += len(dat)
+    workers = 1
+    code_flow = False
+    entries = []
+    labels = False
+    xref_name = None
+    incremental = False
+    for i in range(4, len(arg_parse)):
+        if arg_parse[i] == '-j':
+            workers = int(arg_parse[i + 1]) or None
+        elif arg_parse[i] == '-c':
+            code_flow = True
+        elif arg_parse[i] == '-e':
+            entries.append(int(arg_parse[i + 1], 16))
+        elif arg_parse[i] == '-i':
+            incremental = True
+        elif arg_parse[i] == '-l':
+            labels = True
+        elif arg_parse[i] == '-x':
+            xref_name = arg_parse[i + 1]
 
-    print(s)
+    disassemble_files(arg_parse[1], int(arg_parse[2], 16), arg_parse[3], workers=workers,
+                      code_flow=code_flow, entries=entries, labels=labels, xref_name=xref_name,
+                      incremental=incremental)
@@ -0,0 +1,105 @@
+import concurrent.futures
+import sys
+import time
+
+from opcodetools.dasm import disassemble_files
+
+# py -m opcodetools.dasm_batch jobs.txt
+# Add -j 4 to run the jobs in 4 processes (-j 0 for one per core)
+#
+# Disassembles many ROM sets in one process. The CPUs are built once and shared by every
+# job that uses them. Each line of the manifest is a job with the same arguments as
+# dasm plus the output file:
+#
+#   ; CPU   origin  files                        output
+#   Z80     0       phoenix/ic45+phoenix/ic46    phoenix.txt
+#   6809    8000    main.bin@8000+sub.bin@C000   digdug2.txt
+#
+# Blank lines and lines beginning with ";" or "#" are ignored.
+
+
+def load_manifest(name: str) -> list:
+    '''Read the jobs from a manifest file
+
+    Args:
+        name (str): the manifest file name
+
+    Returns:
+        list: (cpu name, origin, files, output) for each job
+    '''
+
+    jobs = []
+    with open(name) as f:
+        for line_no, text in enumerate(f, 1):
+            text = text.strip()
+            if not text or text[0] in ';#':
+                continue
+            parts = text.split()
+            if len(parts) != 4:
+                raise ValueError('{}:{}: expected "cpu origin files output"'.format(name, line_no))
+            jobs.append((parts[0], int(parts[1], 16), parts[2], parts[3]))
+    return jobs
+
+
+def run_job(job: tuple) -> tuple:
+    '''Run one disassembly job
+
+    Args:
+        job (tuple): (cpu name, origin, files, output)
+
+    Returns:
+        tuple: (output, number of lines, seconds, error message or None)
+    '''
+
+    cpuname, org, names, output = job
+    start = time.perf_counter()
+    try:
+        with open(output, 'w', buffering=1024 * 1024) as out:
+            lines = disassemble_files(cpuname, org, names, out)
+        error = None
+    except Exception as ex:
+        lines = 0
+        error = str(ex)
+    return output, lines, time.perf_counter() - start, error
+
+
+def run_batch(jobs: list, workers: int=1):
+    '''Run all the jobs (yielding each result as it finishes, in manifest order)
+
+    Args:
+        jobs (list): (cpu name, origin, files, output) for each job
+        workers (int): number of processes (None for one per core) [default is 1]
+
+    Yields:
+        tuple: the result of each job (see "run_job")
+    '''
+
+    if workers == 1:
+        for job in jobs:
+            yield run_job(job)
+    else:
+        with concurrent.futures.ProcessPoolExecutor(workers) as pool:
+            yield from pool.map(run_job, jobs)
+
+
+if __name__ == '__main__':
+
+    workers = 1
+    for i in range(2, len(sys.argv)):
+        if sys.argv[i] == '-j':
+            workers = int(sys.argv[i + 1]) or None
+
+    jobs = load_manifest(sys.argv[1])
+
+    start = time.perf_counter()
+    failed = 0
+    for output, lines, seconds, error in run_batch(jobs, workers):
+        if error:
+            failed += 1
+            print('{:>8.3f}s  {}  FAILED: {}'.format(seconds, output, error))
+        else:
+            print('{:>8.3f}s  {}  {} lines'.format(seconds, output, lines))
+    print('{:>8.3f}s  total for {} jobs ({} failed)'.format(time.perf_counter() - start, len(jobs), failed))
+
+    if failed:
+        sys.exit(1)
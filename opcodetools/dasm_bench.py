@@ -0,0 +1,36 @@
+import random
+import sys
+import time
+
+from opcodetools.cpu import cpu_manager
+from opcodetools.disassembler.disassembler import disassemble
+
+# py -m opcodetools.dasm_bench Z80
+#
+# Disassembles random images from 4K to 4M and prints the time per byte. The
+# time per byte should stay flat as the image grows (linear scaling).
+
+cpuname = 'Z80'
+if len(sys.argv) > 1:
+    cpuname = sys.argv[1]
+
+cpu = cpu_manager.get_cpu_by_name(cpuname)
+
+SIZES = [4 * 1024, 16 * 1024, 64 * 1024, 256 * 1024, 1024 * 1024, 4 * 1024 * 1024]
+
+
+def disassemble_all(bindata, org):
+    for _ in disassemble(cpu, bindata, org):
+        pass
+
+
+print('; CPU:', cpuname)
+print('{:>10} {:>10} {:>10}'.format('bytes', 'seconds', 'us/byte'))
+
+rnd = random.Random(0)
+for size in SIZES:
+    bindata = [rnd.randrange(256) for _ in range(size)]
+    start = time.perf_counter()
+    disassemble_all(bindata, 0)
+    elapsed = time.perf_counter() - start
+    print('{:>10} {:>10.3f} {:>10.3f}'.format(size, elapsed, elapsed * 1000000 / size))
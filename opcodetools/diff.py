@@ -1,14 +1,15 @@
 import sys
 
-with open(sys.argv[1],'rb') as f:
-    d1 = f.read()
+from opcodetools.utils import binary
 
-with open(sys.argv[2],'rb') as f:
-    d2 = f.read()
+# py -m opcodetools.diff "a.bin+b.bin" c.bin
+
+d1 = binary.load_binary(sys.argv[1])
+d2 = binary.load_binary(sys.argv[2])
 
 if len(d1)!=len(d2):
     print('Different lengths')
-else:
+elif d1 != d2:
     for i in range(len(d1)):
         if d1[i]!=d2[i]:
-            print("Different at",hex(i))
\ No newline at end of file
+            print("Different at",hex(i))
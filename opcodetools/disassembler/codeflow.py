@@ -0,0 +1,185 @@
+'''
+  Code-flow (recursive descent) disassembly.
+
+  A linear sweep decodes everything as code. Tables and text in the middle of a ROM come
+  out as garbage instructions, and the sweep can stay out of step with the real code for
+  a while after them.
+
+  Here decoding starts only at the entry points (and the addresses in the vectors). Each
+  instruction's code targets (jumps, branches, calls) are added to a worklist, and the
+  instruction after it is decoded too unless the flow ends there (an unconditional jump
+  or return). A bitmap marks every byte that has been decoded, so no byte is decoded more
+  than once and the whole trace is linear in the size of the image.
+
+  Everything not reached is data.
+
+  Pass a DecodeCache (see decode_cache.py) to reuse the instructions decoded by earlier
+  runs over the same image.
+'''
+
+# Values in the trace bitmap
+DATA = 0
+CODE_START = 1  # First byte of an instruction
+CODE = 2  # The other bytes of an instruction
+
+# Bytes on each line of data
+DATA_PER_LINE = 4
+
+
+def read_vector(cpu, buffer, origin: int, address: int):
+    '''Read a two byte pointer from the image
+
+    Args:
+        cpu (CPU): the CPU (for the byte order)
+        buffer (bytes): the image
+        origin (int): the address of the first byte in the buffer
+        address (int): the address of the pointer
+
+    Returns:
+        int: the pointer (or None if it isn't in the image)
+    '''
+
+    pos = address - origin
+    if pos < 0 or pos + 2 > len(buffer):
+        return None
+    if cpu.little_endian:
+        return buffer[pos] | (buffer[pos + 1] << 8)
+    return (buffer[pos] << 8) | buffer[pos + 1]
+
+
+def get_entry_points(cpu, buffer, origin: int, entries: list=None, vectors: list=None) -> list:
+    '''Collect the starting addresses for the trace
+
+    Args:
+        cpu (CPU): the CPU
+        buffer (bytes): the image
+        origin (int): the address of the first byte in the buffer
+        entries (list): addresses where code starts [default is the CPU's ENTRY_POINTS]
+        vectors (list): addresses of pointers to code [default is the CPU's VECTORS]
+
+    Returns:
+        list: the addresses
+    '''
+
+    if entries is None:
+        entries = cpu.ENTRY_POINTS
+    if vectors is None:
+        vectors = cpu.VECTORS
+    ret = list(entries)
+    for v in vectors:
+        target = read_vector(cpu, buffer, origin, v)
+        if target is not None:
+            ret.append(target)
+    return ret
+
+
+def trace_code(cpu, buffer, origin: int, entry_points: list, cache=None):
+    '''Follow the code flow from the entry points
+
+    Args:
+        cpu (CPU): the CPU
+        buffer (bytes): the image
+        origin (int): the address of the first byte in the buffer
+        entry_points (list): addresses to start from (those outside the image are ignored)
+        cache (DecodeCache): decoded instructions to reuse [default is None for no cache]
+
+    Returns:
+        tuple: (bitmap of DATA/CODE_START/CODE for each byte, dict of offset -> (opcode, fills))
+    '''
+
+    end = len(buffer)
+    marks = bytearray(end)
+    decoded = {}
+    bad = set()  # Places that don't decode (so we only try once)
+
+    find = cpu.find_opcodes_for_binary
+    get_fills = cpu.get_mnemonic_fills
+
+    work = [address - origin for address in reversed(entry_points)]
+    while work:
+        pos = work.pop()
+        while 0 <= pos < end and not marks[pos] and pos not in bad:
+            if cache is not None:
+                hit = cache.decode(pos)
+                ops = [hit[0]] if hit else []
+            else:
+                ops = find(buffer, offset=pos)
+            if len(ops) != 1:
+                # Not an instruction ... this path is bad
+                bad.add(pos)
+                break
+            opc = ops[0]
+            size = len(opc.code)
+            if pos + size > end or any(marks[pos:pos + size]):
+                # Runs off the image or into an instruction we already have
+                bad.add(pos)
+                break
+
+            marks[pos] = CODE_START
+            marks[pos + 1:pos + size] = bytes([CODE]) * (size - 1)
+            address = pos + origin
+            fills = hit[1] if cache is not None else get_fills(opc, buffer, address, pos)
+            decoded[pos] = (opc, fills)
+
+            for target in cpu.get_code_targets(opc, address, fills).values():
+                target -= origin
+                if 0 <= target < end and not marks[target]:
+                    work.append(target)
+
+            if cpu.ends_code_flow(opc, fills):
+                break
+            pos += size
+
+    return marks, decoded
+
+
+def disassemble_code_flow(cpu, buffer, origin: int=0, entries: list=None, vectors: list=None, cache=None):
+    '''Disassemble a buffer by following the code flow
+
+    The records are the same as "disassemble" makes (see disassembler.py). Data lines have
+    an 'opcode' of None.
+
+    Args:
+        cpu (CPU): the CPU
+        buffer (bytes): the image
+        origin (int): the address of the first byte in the buffer [default is 0]
+        entries (list): addresses where code starts [default is the CPU's ENTRY_POINTS]
+        vectors (list): addresses of pointers to code [default is the CPU's VECTORS]
+        cache (DecodeCache): decoded instructions to reuse [default is None for no cache]
+
+    Yields:
+        dict: a record for each line of disassembly
+    '''
+
+    marks, decoded = trace_code(cpu, buffer, origin, get_entry_points(cpu, buffer, origin, entries, vectors), cache)
+
+    end = len(buffer)
+    pos = 0
+    while pos < end:
+        address = pos + origin
+        if marks[pos] == CODE_START:
+            opc, fills = decoded[pos]
+            size = len(opc.code)
+            yield {
+                'address': address,
+                'data': bytes(buffer[pos:pos + size]),
+                'opcode': opc,
+                'fills': fills,
+                'text': cpu.binary_to_string(opc, buffer, address, fills, pos),
+            }
+            pos += size
+            continue
+
+        # A run of data (up to the next instruction)
+        size = 1
+        while size < DATA_PER_LINE and pos + size < end and marks[pos + size] == DATA:
+            size += 1
+        data = bytes(buffer[pos:pos + size])
+        yield {
+            'address': address,
+            'data': data,
+            'opcode': None,
+            'fills': {},
+            'text': cpu.binary_to_string_data(address, data),
+        }
+        pos += size
@@ -0,0 +1,123 @@
+import hashlib
+import marshal
+import os
+
+from opcodetools.cpu import table_cache
+
+'''
+  A persistent cache of decoded instructions for code-flow disassembly.
+
+  Annotating a ROM means running the disassembler over and over with small changes to the
+  entry points. Every run decodes the same instructions at the same places again. What an
+  instruction decodes to depends only on the CPU, the image, and where it is, so the
+  results are kept on disk keyed by (CPU, image hash, offset):
+
+    decoded : offset -> (opcode index, fills) or (-1, None) where nothing decodes
+
+  A rerun looks each offset up first and only decodes what it hasn't seen before, which
+  is just the regions whose classification changed. Entries are only ever added, since a
+  decode at an offset can't go stale while the image stays the same. The line text is
+  not kept (it is quick to make from the decode, and would make the file many times
+  bigger than the image).
+
+  The CPU part of the key is the opcode table's cache key (see table_cache). The opcode
+  indexes in the file are only good for that table, and the key changes whenever the
+  tables or the disassembly code change. The origin is part of the key too (it shows up
+  in relative targets and in the text).
+
+  The files live in a "decode" directory in the table cache directory.
+'''
+
+CACHE_VERSION = 2
+
+
+def _get_decode_path(cpu, buffer, origin: int):
+    '''Return the cache file for the image (or None if caching is off)'''
+
+    d = table_cache.get_cache_dir(True)
+    if not d:
+        return None
+    cpu_key = table_cache.get_table_key(cpu)
+    if not cpu_key:
+        return None
+    image_key = hashlib.sha1(buffer).hexdigest()
+    return os.path.join(d, 'decode',
+                        '{}-{}-{}-{:x}.marshal'.format(cpu_key, CACHE_VERSION, image_key, origin))
+
+
+class DecodeCache:
+
+    '''The decoded instructions for one image'''
+
+    def __init__(self, cpu, buffer, origin: int=0, persist: bool=True):
+        '''Create the cache (and load what earlier runs saved)
+
+        Args:
+            cpu (CPU): the CPU
+            buffer (bytes): the image
+            origin (int): the address of the first byte in the buffer [default is 0]
+            persist (bool): True to load and save the cache file [default is True]
+        '''
+
+        self.cpu = cpu
+        self.buffer = buffer
+        self.origin = origin
+        self.path = _get_decode_path(cpu, buffer, origin) if persist else None
+        self.decoded = {}
+        self._dirty = False
+        self._opcodes = cpu._opcodes
+        self._indexes = None
+
+        if self.path:
+            try:
+                with open(self.path, 'rb') as f:
+                    self.decoded = marshal.loads(f.read())
+            except Exception:
+                # Missing or damaged ... start empty
+                pass
+
+    def decode(self, pos: int):
+        '''Decode the instruction at an offset
+
+        Args:
+            pos (int): the offset in the buffer
+
+        Returns:
+            tuple: (opcode, fills) or None if nothing decodes there
+        '''
+
+        hit = self.decoded.get(pos)
+        if hit is not None:
+            if hit[0] < 0:
+                return None
+            return self._opcodes[hit[0]], hit[1]
+
+        self._dirty = True
+        ops = self.cpu.find_opcodes_for_binary(self.buffer, offset=pos)
+        if len(ops) != 1:
+            self.decoded[pos] = (-1, None)
+            return None
+        opc = ops[0]
+        fills = self.cpu.get_mnemonic_fills(opc, self.buffer, pos + self.origin, pos)
+        if self._indexes is None:
+            self._indexes = {op: i for i, op in enumerate(self._opcodes)}
+        self.decoded[pos] = (self._indexes[opc], fills)
+        return opc, fills
+
+    def save(self):
+        '''Save the cache file (if anything was added)
+
+        Failing to write the file is not an error (the next run just decodes again).
+        '''
+
+        if not self.path or not self._dirty:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp = self.path + '.' + str(os.getpid())
+            with open(tmp, 'wb') as f:
+                f.write(marshal.dumps(self.decoded))
+            os.replace(tmp, self.path)
+            self._dirty = False
+        except (OSError, ValueError):
+            pass
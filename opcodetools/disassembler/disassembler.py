@@ -0,0 +1,201 @@
+import bisect
+import concurrent.futures
+import os
+import sys
+
+from opcodetools.cpu import cpu_manager
+
+'''
+  Library entry point for disassembly.
+
+  "disassemble" is a generator. It sweeps the buffer one instruction at a time and yields
+  a record (a dict) for each line:
+
+    'address' : the address of the line
+    'data'    : the bytes of the line (bytes)
+    'opcode'  : the Opcode (None for an unknown byte)
+    'fills'   : the opcode's fill-in information (see get_mnemonic_fills)
+    'text'    : the line of disassembly
+
+  Nothing is collected along the way. Hand the generator to "write_lines" to stream a
+  multi-megabyte image to a file in large chunks with constant memory.
+
+  "disassemble_parallel" spreads a big image across processes. Each process sweeps one
+  chunk starting at the chunk's first byte (a guess: an instruction from the chunk
+  before might run into it). The chunks are then stitched together in order. Where the
+  sweep coming out of the chunk before doesn't land on one of the guessed instruction
+  starts, it is decoded here one instruction at a time until it does. From that point on
+  the two sweeps are the same. The output is identical to "disassemble".
+'''
+
+# Characters of text collected before each write
+WRITE_CHUNK_SIZE = 256 * 1024
+
+# Bytes of image given to each process
+PARALLEL_CHUNK_SIZE = 256 * 1024
+
+
+def disassemble(cpu, buffer, origin: int=0, start: int=0, end: int=None):
+    '''Disassemble a buffer (a linear sweep)
+
+    An instruction that starts before "end" is decoded in full even if it runs past
+    "end" (as long as the buffer holds it).
+
+    Args:
+        cpu (CPU): the CPU
+        buffer (bytes): the image (bytes, bytearray, memoryview, or list of ints)
+        origin (int): the address of the first byte in the buffer [default is 0]
+        start (int): offset in the buffer to start at [default is 0]
+        end (int): offset in the buffer to stop at [default is the end of the buffer]
+
+    Yields:
+        dict: a record for each line of disassembly
+    '''
+
+    if end is None:
+        end = len(buffer)
+
+    find = cpu.find_opcodes_for_binary
+    get_fills = cpu.get_mnemonic_fills
+    to_string = cpu.binary_to_string
+
+    pos = start
+    while pos < end:
+        address = pos + origin
+        ops = find(buffer, offset=pos)
+        if len(ops) != 1:
+            value = buffer[pos]
+            yield {
+                'address': address,
+                'data': bytes((value,)),
+                'opcode': None,
+                'fills': {},
+                'text': cpu.binary_to_string_unknown(address, value),
+            }
+            pos += 1
+            continue
+
+        opc = ops[0]
+        size = len(opc.code)
+        fills = get_fills(opc, buffer, address, pos)
+        yield {
+            'address': address,
+            'data': bytes(buffer[pos:pos + size]),
+            'opcode': opc,
+            'fills': fills,
+            'text': to_string(opc, buffer, address, fills, pos),
+        }
+        pos += size
+
+
+def _disassemble_chunk(job):
+    '''Sweep one chunk of a parallel disassembly (runs in a worker process)
+
+    Args:
+        job (tuple): (CPU name, chunk bytes plus lookahead, address of the chunk, chunk length)
+
+    Returns:
+        tuple: (offset of each line, text of each line, offset where the sweep left the chunk)
+    '''
+
+    cpuname, data, address, length = job
+    cpu = cpu_manager.get_cpu_by_name(cpuname)
+    offsets = []
+    texts = []
+    pos = 0
+    for line in disassemble(cpu, data, address, 0, length):
+        offsets.append(line['address'] - address)
+        texts.append(line['text'])
+        pos = offsets[-1] + len(line['data'])
+    return offsets, texts, pos
+
+
+def disassemble_parallel(cpuname: str, buffer, origin: int=0, workers: int=None,
+                         chunk_size: int=PARALLEL_CHUNK_SIZE):
+    '''Disassemble a buffer with a pool of processes
+
+    The lines are the same as "disassemble" makes, but the records only hold the
+    'address', 'data', and 'text' (opcodes and fills don't come back from the workers).
+
+    Args:
+        cpuname (str): the CPU name (each worker makes its own)
+        buffer (bytes): the image
+        origin (int): the address of the first byte in the buffer [default is 0]
+        workers (int): number of processes [default is one per core]
+        chunk_size (int): bytes of image in each chunk
+
+    Yields:
+        dict: a record for each line of disassembly
+    '''
+
+    cpu = cpu_manager.get_cpu_by_name(cpuname)
+    end = len(buffer)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers == 1 or end <= chunk_size:
+        yield from disassemble(cpu, buffer, origin)
+        return
+
+    # Enough extra bytes past the chunk to decode any instruction that starts in it
+    lookahead = max(len(op.code) for op in cpu._opcodes)
+
+    starts = range(0, end, chunk_size)
+    jobs = ((cpuname, bytes(buffer[s:s + chunk_size + lookahead]), origin + s, min(chunk_size, end - s))
+            for s in starts)
+
+    pos = 0
+    with concurrent.futures.ProcessPoolExecutor(workers) as pool:
+        for s, (offsets, texts, chunk_pos) in zip(starts, pool.map(_disassemble_chunk, jobs)):
+            chunk_end = min(s + chunk_size, end)
+
+            # Decode here until the sweep lands on an instruction the worker found
+            while pos < chunk_end:
+                i = bisect.bisect_left(offsets, pos - s)
+                if i < len(offsets) and offsets[i] == pos - s:
+                    break
+                for line in disassemble(cpu, buffer, origin, pos, pos + 1):
+                    yield {'address': line['address'], 'data': line['data'], 'text': line['text']}
+                    pos += len(line['data'])
+            else:
+                # The sweep passed right over this chunk
+                continue
+
+            # In sync ... the rest of the chunk is the worker's
+            next_offsets = offsets[i + 1:] + [chunk_pos]
+            for off, next_off, text in zip(offsets[i:], next_offsets, texts[i:]):
+                yield {'address': origin + s + off, 'data': bytes(buffer[s + off:s + next_off]), 'text': text}
+            pos = s + chunk_pos
+
+
+def write_lines(lines, out=None, chunk_size: int=WRITE_CHUNK_SIZE):
+    '''Write the text of line records in large chunks
+
+    Args:
+        lines (iterable): line records (see "disassemble")
+        out (file): where to write [default is sys.stdout]
+        chunk_size (int): characters to collect before each write
+
+    Returns:
+        int: the number of lines written
+    '''
+
+    if out is None:
+        out = sys.stdout
+
+    count = 0
+    buf = []
+    size = 0
+    for line in lines:
+        text = line['text']
+        buf.append(text)
+        size += len(text) + 1
+        count += 1
+        if size >= chunk_size:
+            buf.append('')
+            out.write('\n'.join(buf))
+            buf = []
+            size = 0
+    if buf:
+        buf.append('')
+        out.write('\n'.join(buf))
+    return count
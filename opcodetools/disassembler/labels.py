@@ -0,0 +1,116 @@
+import bisect
+from array import array
+
+'''
+  Automatic labels for disassembly.
+
+  The first pass ("collect_labels") runs over the line records once and gathers every
+  code target (jumps, branches, calls) along with the address of every line. The targets
+  that land on the start of a line become labels. They are kept in a sorted array, so a
+  lookup is a binary search and the whole thing is O(n log n) even for big images.
+
+  The second pass ("label_lines") runs over the same records again. It adds a label line
+  before each labeled address and rewrites the operands that point at a label to use the
+  label's name.
+
+  Both passes take any iterable of records, so a disassembly can be made twice (once for
+  each pass) instead of being held in memory.
+'''
+
+
+class LabelIndex:
+
+    '''The sorted addresses that get labels'''
+
+    def __init__(self, targets, starts, prefix: str='L'):
+        '''Create the index
+
+        Args:
+            targets (iterable): the code target addresses (any order, repeats are fine)
+            starts (array): the address of every line (sorted)
+            prefix (str): the start of each label name [default is "L"]
+        '''
+
+        self.prefix = prefix
+        self.addresses = array('l')
+        for target in sorted(set(targets)):
+            # Only targets at the start of a line can be labeled
+            i = bisect.bisect_left(starts, target)
+            if i < len(starts) and starts[i] == target:
+                self.addresses.append(target)
+
+    def __len__(self) -> int:
+        return len(self.addresses)
+
+    def __contains__(self, address: int) -> bool:
+        i = bisect.bisect_left(self.addresses, address)
+        return i < len(self.addresses) and self.addresses[i] == address
+
+    def name(self, address: int) -> str:
+        '''Return the label name for an address
+
+        Args:
+            address (int): the address
+
+        Returns:
+            str: the label name
+        '''
+
+        return '{}{:04X}'.format(self.prefix, address)
+
+
+def collect_labels(cpu, lines, prefix: str='L') -> LabelIndex:
+    '''Gather the code targets from line records
+
+    Args:
+        cpu (CPU): the CPU
+        lines (iterable): line records in address order (see disassembler.py)
+        prefix (str): the start of each label name [default is "L"]
+
+    Returns:
+        LabelIndex: the labels
+    '''
+
+    targets = array('l')
+    starts = array('l')
+    for line in lines:
+        address = line['address']
+        starts.append(address)
+        opc = line.get('opcode')
+        if opc is not None:
+            targets.extend(cpu.get_code_targets(opc, address, line['fills']).values())
+    return LabelIndex(targets, starts, prefix)
+
+
+def label_lines(cpu, lines, index: LabelIndex):
+    '''Add the labels to line records and rewrite the operands that use them
+
+    Label lines have no data and an 'opcode' of None.
+
+    Args:
+        cpu (CPU): the CPU
+        lines (iterable): line records in address order (see disassembler.py)
+        index (LabelIndex): the labels (see "collect_labels")
+
+    Yields:
+        dict: the records (with the label lines added)
+    '''
+
+    for line in lines:
+        address = line['address']
+        if address in index:
+            yield {'address': address, 'data': b'', 'opcode': None, 'fills': {}, 'text': index.name(address) + ':'}
+
+        opc = line.get('opcode')
+        if opc is not None:
+            fills = None
+            for letter, target in cpu.get_code_targets(opc, address, line['fills']).items():
+                if target in index:
+                    if fills is None:
+                        fills = dict(line['fills'])
+                    fills[letter] = dict(fills[letter], sub_value=index.name(target))
+            if fills is not None:
+                text = cpu.binary_to_string(opc, line['data'], address, fills)
+                line = dict(line, fills=fills, text=text)
+
+        yield line
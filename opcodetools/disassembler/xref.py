@@ -0,0 +1,157 @@
+import bisect
+from array import array
+
+from opcodetools.cpu.base_disassembly import XREF_CODE, XREF_PORT, XREF_READ, XREF_WRITE
+
+'''
+  Cross references: which instructions use each address, and how.
+
+  The "use" of every fill-in says whether it is data, a port, or code and whether it is
+  read or written (see base_cpu). Each reference is one entry in three parallel arrays
+  (target address, instruction address, access kind) sorted by target. There are no
+  per-address lists. A lookup is a binary search for the run of entries with that target.
+'''
+
+
+class XrefIndex:
+
+    '''Target address -> (instruction address, access kind) for every reference'''
+
+    def __init__(self, targets: array, sources: array, kinds: array):
+        '''Create the index from unsorted references
+
+        Args:
+            targets (array): the address used by each reference
+            sources (array): the address of the instruction making each reference
+            kinds (array): the access kind of each reference (XREF_* bits)
+        '''
+
+        order = sorted(range(len(targets)), key=lambda i: (targets[i], sources[i]))
+        self.targets = array('l', (targets[i] for i in order))
+        self.sources = array('l', (sources[i] for i in order))
+        self.kinds = array('B', (kinds[i] for i in order))
+
+    def __len__(self) -> int:
+        return len(self.targets)
+
+    def refs_to(self, address: int, kind: int=0) -> list:
+        '''Return the references to an address
+
+        Args:
+            address (int): the address
+            kind (int): only references with all of these XREF_* bits [default is all references]
+
+        Returns:
+            list: (instruction address, access kind) for each reference
+        '''
+
+        lo = bisect.bisect_left(self.targets, address)
+        hi = bisect.bisect_right(self.targets, address, lo)
+        return [(self.sources[i], self.kinds[i]) for i in range(lo, hi) if self.kinds[i] & kind == kind]
+
+    def writers(self, address: int) -> list:
+        '''Return the addresses of the instructions that write an address'''
+
+        return [src for src, _ in self.refs_to(address, XREF_WRITE)]
+
+    def readers(self, address: int) -> list:
+        '''Return the addresses of the instructions that read an address'''
+
+        return [src for src, _ in self.refs_to(address, XREF_READ)]
+
+    def callers(self, address: int) -> list:
+        '''Return the addresses of the instructions that jump, branch, or call to an address'''
+
+        return [src for src, _ in self.refs_to(address, XREF_CODE)]
+
+    def addresses(self, start: int=None, end: int=None) -> list:
+        '''Return the referenced addresses (in order)
+
+        Args:
+            start (int): the first address [default is the lowest]
+            end (int): one past the last address [default is past the highest]
+
+        Returns:
+            list: the addresses
+        '''
+
+        lo = 0 if start is None else bisect.bisect_left(self.targets, start)
+        hi = len(self.targets) if end is None else bisect.bisect_left(self.targets, end)
+        ret = []
+        for i in range(lo, hi):
+            if not ret or ret[-1] != self.targets[i]:
+                ret.append(self.targets[i])
+        return ret
+
+
+def build_xref(cpu, lines) -> XrefIndex:
+    '''Gather the references from line records
+
+    Args:
+        cpu (CPU): the CPU
+        lines (iterable): line records (see disassembler.py)
+
+    Returns:
+        XrefIndex: the references
+    '''
+
+    targets = array('l')
+    sources = array('l')
+    kinds = array('B')
+    for line in lines:
+        opc = line.get('opcode')
+        if opc is not None:
+            address = line['address']
+            for target, kind in cpu.get_references(opc, address, line['fills']).values():
+                targets.append(target)
+                sources.append(address)
+                kinds.append(kind)
+    return XrefIndex(targets, sources, kinds)
+
+
+def kind_to_string(kind: int) -> str:
+    '''Return a short string for an access kind ("R", "W", "RW", "J", "P-W" ...)
+
+    Args:
+        kind (int): the XREF_* bits
+
+    Returns:
+        str: the string
+    '''
+
+    if kind & XREF_CODE:
+        return 'J'
+    ret = ''
+    if kind & XREF_READ:
+        ret += 'R'
+    if kind & XREF_WRITE:
+        ret += 'W'
+    if kind & XREF_PORT:
+        ret = 'P-' + ret
+    return ret or '?'
+
+
+def write_xref(index: XrefIndex, out, address_size: int=4):
+    '''Write every referenced address and the instructions that use it
+
+        D000: C012 W, C020 R
+
+    Args:
+        index (XrefIndex): the references
+        out (file): where to write
+        address_size (int): number of hex digits in an address [default is 4]
+    '''
+
+    fs = '{:0' + str(address_size) + 'X}'
+    buf = []
+    i = 0
+    n = len(index)
+    while i < n:
+        target = index.targets[i]
+        refs = []
+        while i < n and index.targets[i] == target:
+            refs.append(fs.format(index.sources[i]) + ' ' + kind_to_string(index.kinds[i]))
+            i += 1
+        buf.append(fs.format(target) + ': ' + ', '.join(refs))
+    buf.append('')
+    out.write('\n'.join(buf))
@@ -1,4 +1,6 @@
-from typing import List
+import mmap
+import os
+from typing import List, Union
 
 # TODO we need an object representing a line of disassembly and its parts (address, data, mnemonic, comment)
 # TODO then a function to parse that
@@ -63,26 +65,68 @@ def line_to_data(line):
 
     return org, ret
 
-def load_binary(names: str) -> List[int]:
+MMAP_THRESHOLD = 1024 * 1024  # Files this big (or bigger) are memory-mapped
+
+
+def _map_file(name: str):
+    """Read one file as bytes (memory-mapped if it is large)
+
+    Args:
+        name (str) : the file name
+    Returns:
+        bytes|memoryview : the file data
+    """
+
+    with open(name, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size < MMAP_THRESHOLD:
+            return f.read()
+        # The map stays valid after the file is closed
+        return memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+
+def load_binary(names: str, origin: int = 0, fill: int = 0xFF) -> Union[bytes, bytearray, memoryview]:
     """Read a group of binary files
 
     For example "a.bin + b.bin + c.bin"
 
+    Each file can be given its own origin (hex) with "@". For example
+    "a.bin@8000 + b.bin@C000". A file with no origin follows right after
+    the one before it. Gaps between files are filled with the fill byte.
+
+    A single large file is memory-mapped rather than read. The data is never
+    expanded to a list of ints.
+
     Args:
         names (str) : the group of names
+        origin (int) : the address of the first byte of the image [default is 0]
+        fill (int) : the value for gaps between files [default is 0xFF]
     Returns:
-        List[int] : the binary data
+        bytes|bytearray|memoryview : the binary data
     """
 
-    # TODO origins on each file
-
-    names = names.split('+')
-    ret = []
-    for n in names:
+    parts = []
+    for n in names.split('+'):
         n = n.strip()
-        with open(n, 'rb') as f:
-            data = f.read()
-            for d in data:
-                ret.append(int(d))
+        org = None
+        if '@' in n:
+            n, org = n.split('@')
+            n = n.strip()
+            org = int(org, 16)
+        parts.append((n, org))
+
+    if len(parts) == 1 and parts[0][1] in (None, origin):
+        return _map_file(parts[0][0])
+
+    ret = bytearray()
+    for n, org in parts:
+        if org is not None:
+            if org < origin:
+                raise ValueError('Origin {:04X} of {} is below the image origin {:04X}'.format(org, n, origin))
+            pos = org - origin
+            if pos < len(ret):
+                raise ValueError('Origin {:04X} of {} overlaps earlier data'.format(org, n))
+            ret.extend(bytes([fill]) * (pos - len(ret)))
+        ret.extend(_map_file(n))
 
     return ret
@@ -0,0 +1,145 @@
+'''
+  Intel HEX and Motorola S-record output.
+
+  Both formats give every record its own address, so the gaps between segments are
+  simply skipped (nothing is padded). Each record is built as one bytes object (count,
+  address, type, data) and turned to text with a single hex() call. The checksum is a
+  sum over the same bytes (the two's complement for Intel HEX and the ones' complement
+  for S-records).
+
+  Intel HEX records hold 16 bit addresses. Data above 64K gets an extended linear
+  address record (type 04) whenever the upper 16 bits change, and no record crosses a
+  64K boundary.
+
+  S-records use S1 (16 bit), S2 (24 bit), or S3 (32 bit) data records depending on the
+  highest address. The file starts with an S0 header and ends with a record count (S5 or
+  S6) and the matching S9, S8, or S7 termination record.
+'''
+
+# File name extensions for each format
+HEX_EXTENSIONS = ['.hex', '.ihx']
+SRECORD_EXTENSIONS = ['.s19', '.s28', '.s37', '.srec', '.mot']
+
+# Data bytes in each record
+RECORD_SIZE = 16
+
+# Size of the write buffer
+BUFFER_SIZE = 1024 * 1024
+
+
+def _record_chunks(segments, record_size: int, boundary: int=None):
+    '''Split segments into (address, data) pieces for records
+
+    Args:
+        segments (list): (origin, data) for each segment
+        record_size (int): the most data bytes in a piece
+        boundary (int): pieces never cross a multiple of this [default is None for no limit]
+
+    Yields:
+        tuple: (address, memoryview of the data)
+    '''
+
+    for org, data in segments:
+        data = memoryview(data)
+        pos = 0
+        while pos < len(data):
+            address = org + pos
+            size = min(record_size, len(data) - pos)
+            if boundary:
+                size = min(size, boundary - address % boundary)
+            yield address, data[pos:pos + size]
+            pos += size
+
+
+def _checksum(record: bytes) -> int:
+    return (-sum(record)) & 0xFF
+
+
+def _srecord_checksum(record: bytes) -> int:
+    return ~sum(record) & 0xFF
+
+
+def intel_hex_lines(segments, record_size: int=RECORD_SIZE):
+    '''Make the records of an Intel HEX file (a generator)
+
+    Args:
+        segments (list): (origin, data) for each segment (see Assembler.get_segments)
+        record_size (int): data bytes in each record [default is 16]
+
+    Yields:
+        str: each record (with its newline)
+    '''
+
+    upper = 0
+    for address, data in _record_chunks(segments, record_size, 0x10000):
+        if address >> 16 != upper:
+            upper = address >> 16
+            rec = bytes((2, 0, 0, 4, upper >> 8, upper & 0xFF))
+            yield ':' + (rec + bytes((_checksum(rec),))).hex().upper() + '\n'
+        rec = bytes((len(data), (address >> 8) & 0xFF, address & 0xFF, 0)) + data
+        yield ':' + (rec + bytes((_checksum(rec),))).hex().upper() + '\n'
+    yield ':00000001FF\n'
+
+
+def srecord_lines(segments, record_size: int=RECORD_SIZE, header: str=''):
+    '''Make the records of a Motorola S-record file (a generator)
+
+    Args:
+        segments (list): (origin, data) for each segment (see Assembler.get_segments)
+        record_size (int): data bytes in each record [default is 16]
+        header (str): text for the S0 header record (cut to 252 bytes) [default is no text]
+
+    Yields:
+        str: each record (with its newline)
+    '''
+
+    end = max((org + len(data) for org, data in segments), default=0)
+    if end <= 0x10000:
+        data_type, end_type, asize = '1', '9', 2
+    elif end <= 0x1000000:
+        data_type, end_type, asize = '2', '8', 3
+    else:
+        data_type, end_type, asize = '3', '7', 4
+
+    def record(rtype: str, address: int, asz: int, data: bytes=b''):
+        rec = bytes((asz + len(data) + 1,)) + address.to_bytes(asz, 'big') + data
+        return 'S' + rtype + (rec + bytes((_srecord_checksum(rec),))).hex().upper() + '\n'
+
+    # The count byte covers the address, the text, and the checksum
+    yield record('0', 0, 2, header.encode()[:255 - 3])
+    count = 0
+    for address, data in _record_chunks(segments, record_size):
+        yield record(data_type, address, asize, data)
+        count += 1
+    if count <= 0xFFFF:
+        yield record('5', count, 2)
+    else:
+        yield record('6', count, 3)
+    yield record(end_type, 0, asize)
+
+
+def write_intel_hex(name: str, segments, record_size: int=RECORD_SIZE):
+    '''Write an Intel HEX file
+
+    Args:
+        name (str): the file to create
+        segments (list): (origin, data) for each segment
+        record_size (int): data bytes in each record [default is 16]
+    '''
+
+    with open(name, 'w', buffering=BUFFER_SIZE) as f:
+        f.writelines(intel_hex_lines(segments, record_size))
+
+
+def write_srecord(name: str, segments, record_size: int=RECORD_SIZE, header: str=''):
+    '''Write a Motorola S-record file
+
+    Args:
+        name (str): the file to create
+        segments (list): (origin, data) for each segment
+        record_size (int): data bytes in each record [default is 16]
+        header (str): text for the S0 header record [default is no text]
+    '''
+
+    with open(name, 'w', buffering=BUFFER_SIZE) as f:
+        f.writelines(srecord_lines(segments, record_size, header))
@@ -0,0 +1,23 @@
+import pytest
+
+from opcodetools.assembler.assembler import Assembler
+
+
+@pytest.fixture
+def assemble(tmp_path):
+    '''Assemble source text and return (binary, listing) as the asm script writes them
+
+    Pass None for the text to assemble the file that is already there.
+    '''
+
+    def run(text, two_pass=False, cache=None, name='test.asm'):
+        src = tmp_path / name
+        if text is not None:
+            src.write_text(text)
+        a = Assembler(str(src), None, cache)
+        a.assemble(two_pass)
+        a.write_binary(str(tmp_path / 'test.bin'))
+        a.write_listing(str(tmp_path / 'test.lst'))
+        return (tmp_path / 'test.bin').read_bytes(), (tmp_path / 'test.lst').read_text()
+
+    return run
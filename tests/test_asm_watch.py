@@ -0,0 +1,34 @@
+import io
+
+from opcodetools import asm_watch
+
+
+class _Stop(Exception):
+    pass
+
+
+def test_save_during_build_starts_another(tmp_path, monkeypatch):
+    src = tmp_path / 'main.asm'
+    src.write_text('.cpu Z80\n0x0000:\n  NOP\n')
+    out = tmp_path / 'main.bin'
+
+    real_build = asm_watch.build
+    builds = []
+
+    def build(name, cache, **options):
+        ret = real_build(name, cache, **options)
+        if not builds:
+            # Saved after the build read the file but before it finished
+            src.write_text('.cpu Z80\n0x0000:\n  NOP\n  HALT\n')
+        builds.append(ret)
+        return ret
+
+    def sleep(seconds):
+        # Waiting means the save was missed
+        raise _Stop()
+
+    monkeypatch.setattr(asm_watch, 'build', build)
+    monkeypatch.setattr(asm_watch.time, 'sleep', sleep)
+    asm_watch.watch(str(src), count=2, out=io.StringIO(), bin_name=str(out))
+    assert builds == [None, None]
+    assert out.read_bytes() == bytes([0x00, 0x76])
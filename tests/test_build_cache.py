@@ -0,0 +1,78 @@
+import os
+import shutil
+import sys
+
+from opcodetools.assembler.build_cache import BuildCache, _get_build_path
+from opcodetools.cpu import cpu_manager, table_cache
+
+MAIN = '''.cpu Z80
+.include defs.asm
+0x0000:
+Start:
+  LD B,COUNT
+_loop:
+  CALL Sub
+  DJNZ _loop
+  JP Start
+Sub:
+  LD A,COUNT+1
+  LD HL,Table
+  RET
+Table:
+. COUNT, word Sub
+'''
+
+
+def _write(path, text, stamp):
+    # Each edit gets its own modification time (the cache checks it first)
+    path.write_text(text)
+    os.utime(path, ns=(stamp, stamp))
+
+
+def _build(assemble, path, cache):
+    out = assemble(None, cache=cache, name=path.name)
+    if cache is not None:
+        cache.save()
+        assert os.path.exists(cache.path)
+    return out
+
+
+def test_rebuilds_match_clean_builds(assemble, tmp_path, monkeypatch):
+    monkeypatch.setenv('OPCODETOOLS_CACHE', str(tmp_path / 'cache'))
+    main = tmp_path / 'main.asm'
+    defs = tmp_path / 'defs.asm'
+    _write(defs, '.COUNT = 3\n', 10 ** 9)
+    _write(main, MAIN, 10 ** 9)
+
+    cache = BuildCache(str(main))
+    assert _build(assemble, main, cache) == _build(assemble, main, None)
+
+    # A define changes in the include ... only it is read again, and the lines that
+    # use COUNT are encoded again
+    _write(defs, '.COUNT = 9\n', 2 * 10 ** 9)
+    cache = BuildCache(str(main))
+    assert _build(assemble, main, cache) == _build(assemble, main, None)
+    assert cache.changed == [str(defs)]
+
+    # A line added at the top moves everything after it
+    _write(main, MAIN.replace('Start:\n', 'Start:\n  NOP\n'), 3 * 10 ** 9)
+    cache = BuildCache(str(main))
+    assert _build(assemble, main, cache) == _build(assemble, main, None)
+
+
+def test_keys_follow_the_assembling_code(tmp_path, monkeypatch):
+    monkeypatch.setenv('OPCODETOOLS_CACHE', str(tmp_path / 'cache'))
+    cpu = cpu_manager.get_cpu_by_name('Z80')
+    path = _get_build_path('main.asm')
+    cpu_key = BuildCache().get_cpu_key(cpu)
+    assert cpu_key != table_cache.get_table_key(cpu)
+
+    # An edit to the module that matches and encodes lines changes both keys
+    module = sys.modules['opcodetools.cpu.base_assembly']
+    edited = tmp_path / 'base_assembly.py'
+    shutil.copy(module.__file__, edited)
+    with open(edited, 'a') as f:
+        f.write('\n# edited\n')
+    monkeypatch.setattr(module, '__file__', str(edited))
+    assert _get_build_path('main.asm') != path
+    assert BuildCache().get_cpu_key(cpu) != cpu_key
@@ -0,0 +1,50 @@
+from opcodetools.cpu import cpu_manager
+from opcodetools.disassembler.codeflow import disassemble_code_flow
+
+# A 6502 ROM at FF00: a loop that prints a string (the string sits between the code),
+# a subroutine, an unused routine, and the vectors (NMI, reset, IRQ) at FFFA
+IMAGE = (bytes.fromhex('a200bd10fff0062016ffe8d0f54c0dff4849204c4f008d000460ea60') +
+         b'\xff' * (0xFFFA - 0xFF1C) + bytes.fromhex('00ff00ff16ff'))
+
+# The instructions as the linear sweep printed them before the code flow was added
+CODE = {
+    0xFF00: 'FF00: A2 00           LDX     #$00                  ',
+    0xFF02: 'FF02: BD 10 FF        LDA     $FF10,X                 ',
+    0xFF05: 'FF05: F0 06           BEQ     $FF0D                   ',
+    0xFF07: 'FF07: 20 16 FF        JSR     $FF16                   ',
+    0xFF0A: 'FF0A: E8              INX                         ',
+    0xFF0B: 'FF0B: D0 F5           BNE     $FF02                   ',
+    0xFF0D: 'FF0D: 4C 0D FF        JMP     $FF0D                   ',
+    0xFF16: 'FF16: 8D 00 04        STA     $0400                   ',
+    0xFF19: 'FF19: 60              RTS                         ',
+}
+
+
+def _lines(entries=None):
+    cpu = cpu_manager.get_cpu_by_name('6502')
+    return list(disassemble_code_flow(cpu, IMAGE, 0xFF00, entries))
+
+
+def test_trace_from_vectors():
+    lines = _lines()
+    code = {line['address']: line['text'] for line in lines if line['opcode'] is not None}
+    assert code == CODE
+
+    # The string after the JMP is data (not PHA, EOR, JMP as a sweep decodes it)
+    texts = [line['text'] for line in lines]
+    assert texts[7:9] == ['FF10: 48 49 20 4C     . 0x48,0x49,0x20,0x4C', 'FF14: 4F 00           . 0x4F,0x00']
+    assert texts[11] == 'FF1A: EA 60 FF FF     . 0xEA,0x60,0xFF,0xFF'
+    assert texts[-1] == 'FFFE: 16 FF           . 0x16,0xFF'
+
+    # Every byte is on exactly one line
+    assert b''.join(bytes(line['data']) for line in lines) == IMAGE
+
+
+def test_trace_extra_entry_point():
+    lines = _lines([0xFF1A])
+    code = {line['address']: line['text'] for line in lines if line['opcode'] is not None}
+    assert code == {
+        **CODE,
+        0xFF1A: 'FF1A: EA              NOP                         ',
+        0xFF1B: 'FF1B: 60              RTS                         ',
+    }
@@ -0,0 +1,71 @@
+import random
+
+import pytest
+
+from opcodetools.cpu import cpu_manager
+from opcodetools.disassembler.disassembler import disassemble, disassemble_parallel
+
+# A Z80 image and its linear sweep as the disassembler printed it before the cursor
+# decode and the parallel chunks
+IMAGE = bytes.fromhex(
+    'b9f0f691d574e402d184797105979aab489e0b70810a4e0eede997729eb984d7'
+    '2cb2fdd8589616902a03bf78fa4f9e9b')
+
+SWEEP = [
+    '0100: B9              CP      C                   ',
+    '0101: F0              RET     P                   ',
+    '0102: F6 91           OR      $91                   ',
+    '0104: D5              PUSH    DE                  ',
+    '0105: 74              LD      (HL),H              ',
+    '0106: E4 02 D1        CALL    PO,$D102                ',
+    '0109: 84              ADD     A,H                 ',
+    '010A: 79              LD      A,C                 ',
+    '010B: 71              LD      (HL),C              ',
+    '010C: 05              DEC     B                   ',
+    '010D: 97              SUB     A                   ',
+    '010E: 9A              SBC     D                   ',
+    '010F: AB              XOR     E                   ',
+    '0110: 48              LD      C,B                 ',
+    '0111: 9E              SBC     (HL)                ',
+    '0112: 0B              DEC     BC                  ',
+    '0113: 70              LD      (HL),B              ',
+    '0114: 81              ADD     A,C                 ',
+    '0115: 0A              LD      A,(BC)              ',
+    '0116: 4E              LD      C,(HL)              ',
+    '0117: 0E ED           LD      C,$ED                 ',
+    '0119: E9              JP      (HL)                ',
+    '011A: 97              SUB     A                   ',
+    '011B: 72              LD      (HL),D              ',
+    '011C: 9E              SBC     (HL)                ',
+    '011D: B9              CP      C                   ',
+    '011E: 84              ADD     A,H                 ',
+    '011F: D7              RST     0X10                ',
+    '0120: 2C              INC     L                   ',
+    '0121: B2              OR      D                   ',
+    '0122: FD D8           RET     C                   ',
+    '0124: 58              LD      E,B                 ',
+    '0125: 96              SUB     (HL)                ',
+    '0126: 16 90           LD      D,$90                 ',
+    '0128: 2A 03 BF        LD      HL,($BF03)              ',
+    '012B: 78              LD      A,B                 ',
+    '012C: FA 4F 9E        JP      M,$9E4F                 ',
+    '012F: 9B              SBC     E                   ',
+]
+
+
+def test_sweep_matches_baseline():
+    cpu = cpu_manager.get_cpu_by_name('Z80')
+    assert [line['text'] for line in disassemble(cpu, IMAGE, 0x100)] == SWEEP
+
+
+@pytest.mark.parametrize('cpuname', ['Z80', '6809', '6502'])
+def test_parallel_matches_serial(cpuname):
+    # Small odd-sized chunks, so most chunk starts land inside an instruction and the
+    # stitch has to resync
+    rnd = random.Random(16)
+    image = bytes(rnd.randrange(256) for _ in range(5000))
+    cpu = cpu_manager.get_cpu_by_name(cpuname)
+    serial = [(line['address'], bytes(line['data']), line['text']) for line in disassemble(cpu, image, 0x8000)]
+    parallel = [(line['address'], bytes(line['data']), line['text'])
+                for line in disassemble_parallel(cpuname, image, 0x8000, workers=2, chunk_size=777)]
+    assert parallel == serial
@@ -0,0 +1,112 @@
+import pytest
+
+from opcodetools.assembler.expression import compile_expression
+
+# "$" hex, ascii art, the "<" and ">" addressing marks, and "_" locals in expressions.
+# The expected output is what the assembler made when it used eval.
+SOURCE = '''.cpu Z80
+.BASE = $C000
+.ZP = $10
+.ROWS = (35 + 5) * 4
+.ART = 1..1..11
+.MASK = 0b1..1.1..
+.SMALL = ~ZP & $FF
+0xC000:
+Draw:
+  LD B,ROWS>>2
+_here:
+  DEC B
+  JR NZ,_here
+  LD HL,_here+1
+  LD A,<ZP
+  LD HL,>Clear
+  LD A,(ZP)
+  LD BC,BASE//3
+  LD A,ZP%7
+Clear:
+  LD B,SMALL
+_here:
+  DEC B
+  JR NZ,_here
+  LD DE,_here-Draw
+. $1F, ART & $FF, MASK, ROWS % 7, -2 & $FF, word BASE - 1, 2 ** 4
+'''
+
+BINARY = bytes.fromhex(
+    '06280520fd2103c03e102115c03a10000100403e0206ef0520fd1117001f9b94'
+    '06feffbf10')
+
+LISTING = '''#### Labels
+Clear            = 0xC015
+Clear_here       = 0xC017
+Draw             = 0xC000
+Draw_here        = 0xC002
+
+#### Defines
+ART              = 0x98BD9B
+BASE             = 0xC000
+MASK             = 0x0094
+ROWS             = 0x00A0
+SMALL            = 0x00EF
+ZP               = 0x0010
+
+                  .cpu Z80
+                  .BASE = $C000
+                  .ZP = $10
+                  .ROWS = (35 + 5) * 4
+                  .ART = 1..1..11
+                  .MASK = 0b1..1.1..
+                  .SMALL = ~ZP & $FF
+                  0xC000:
+                  Draw:
+C000: 06 28            LD B,ROWS>>2
+                  _here:
+C002: 05               DEC B
+C003: 20 FD            JR NZ,_here
+C005: 21 03 C0         LD HL,_here+1
+C008: 3E 10            LD A,<ZP
+C00A: 21 15 C0         LD HL,>Clear
+C00D: 3A 10 00         LD A,(ZP)
+C010: 01 00 40         LD BC,BASE//3
+C013: 3E 02            LD A,ZP%7
+                  Clear:
+C015: 06 EF            LD B,SMALL
+                  _here:
+C017: 05               DEC B
+C018: 20 FD            JR NZ,_here
+C01A: 11 17 00         LD DE,_here-Draw
+C01D: 1F 9B 94 06 FE FF BF 10 . $1F, ART & $FF, MASK, ROWS % 7, -2 & $FF, word BASE - 1, 2 ** 4
+'''
+
+NAMES = {'Far': 0x1234, 'Zero': 0x10, 'Start': 0x200}
+
+
+def _eval(s: str, names: dict):
+    # How the assembler evaluated expressions before they were compiled
+    s = s.replace('$', '0x')
+    if '0' <= s[0] <= '9':
+        s = s.replace('.', '0')
+    if s[0] == '<' or s[0] == '>':
+        s = s[1:]
+    return eval(s, None, dict(names))
+
+
+def test_expressions_match_baseline(assemble):
+    binary, listing = assemble(SOURCE)
+    assert binary == BINARY
+    assert listing == LISTING
+
+
+@pytest.mark.parametrize('text', [
+    '$1F', '$10+$20', '1..1', '1..1..11', '0b1..1.1..', '2.5', '<$10', '>Far', '<Zero+1',
+    '(35 + Zero) * 4', 'Far >> 8', 'Far & $FF', 'Far | 1', 'Far ^ Zero', '-Zero', '~Zero & $FF',
+    'Far // 3', 'Far / 2', 'Far % 7', '2 ** 4', 'Far - Start', 'Zero == 16', 'Zero < 3',
+    'max(1, Zero)', 'not Zero',
+])
+def test_compiled_expression_matches_eval(text):
+    assert compile_expression(text)(NAMES) == _eval(text, NAMES)
+
+
+def test_unknown_name_raises_name_error():
+    with pytest.raises(NameError):
+        compile_expression('Missing + 1')(NAMES)
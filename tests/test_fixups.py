@@ -0,0 +1,82 @@
+import pytest
+
+# X changes value after a line that uses it with a forward reference
+REDEFINED = '''.cpu Z80
+0x0000:
+.X = 1
+LD BC,fwd+X
+. fwd, X
+fwd:
+.X = 2
+NOP
+'''
+
+# Forward references in operands, data, and locals (every size is known after the
+# first pass, so the fixups are patched)
+PATCHED = '''.cpu Z80
+0x0100:
+Main:
+  LD HL,Table
+  LD DE,Table+End-Main
+  JR _skip
+  CALL Sub
+_skip:
+  JP NZ,Sub
+  DJNZ _skip
+. word Table, word End, Sub & 0xFF, End - Table
+Sub:
+  LD A,(Count)
+  RET
+.Count = 0x4000
+Table:
+. 1, 2, 3
+End:
+'''
+
+PATCHED_BINARY = bytes.fromhex(
+    '211a011137011803cd1601c2160110fb1a011d0116033a0040c9010203')
+
+# A forward reference that might change an operand's size (the full second pass runs)
+UNSIZED = '''.cpu 6502
+0xC000:
+Reset:
+  LDX #0
+_loop:
+  LDA Data,X
+  BEQ _done
+  STA 0x0400,X
+  INX
+  BNE _loop
+_done:
+  JSR Wait
+  JMP Reset
+Wait:
+  LDY #Delay
+_w:
+  DEY
+  BNE _w
+  RTS
+.Delay = 0x20
+Data:
+. 0x48, 0x49, 0
+. word Reset, word Wait
+'''
+
+UNSIZED_BINARY = bytes.fromhex(
+    'a200bd19c0f0069d0004e8d0f52013c04c00c0a02088d0fd6048490000c013c0')
+
+
+@pytest.mark.parametrize('text,binary', [(PATCHED, PATCHED_BINARY), (UNSIZED, UNSIZED_BINARY)])
+def test_forward_references_match_baseline(assemble, text, binary):
+    # The expected bytes are what the assembler made when it always ran both passes
+    default = assemble(text)
+    assert default[0] == binary
+    assert assemble(text, two_pass=True) == default
+
+
+
+def test_redefined_define_matches_two_pass(assemble):
+    # The forward reference is filled in with the X in effect on its line
+    expected = bytes([0x01, 0x06, 0x00, 0x05, 0x01, 0x00])
+    assert assemble(REDEFINED, two_pass=True)[0] == expected
+    assert assemble(REDEFINED) == assemble(REDEFINED, two_pass=True)
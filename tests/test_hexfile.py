@@ -0,0 +1,50 @@
+from opcodetools.assembler.assembler import Assembler
+from opcodetools.utils.hexfile import intel_hex_lines, srecord_lines
+
+
+def _srecord_bytes(line):
+    # The bytes of a record (count through checksum) after "Sn"
+    return bytes.fromhex(line[2:].strip())
+
+
+def test_srecord_long_header():
+    # The header text is cut to fit the one-byte count
+    lines = list(srecord_lines([(0, b'\x01\x02')], header='x' * 300))
+    rec = _srecord_bytes(lines[0])
+    assert lines[0].startswith('S0')
+    assert rec[0] == 255 and len(rec) == 256
+    assert rec[3:-1] == b'x' * 252
+    assert (sum(rec[:-1]) + rec[-1]) & 0xFF == 0xFF
+
+
+def test_srecord_non_ascii_header():
+    # The limit is in bytes, not characters
+    lines = list(srecord_lines([(0, b'\x01')], header='é' * 200))
+    rec = _srecord_bytes(lines[0])
+    assert rec[0] == 255
+    assert rec[3:-1] == ('é' * 200).encode()[:252]
+
+
+def test_intel_hex_64k_boundary():
+    # A segment that crosses 0x10000 is split there and gets an extended address record
+    lines = list(intel_hex_lines([(0xFFF8, bytes(range(16)))]))
+    assert lines == [
+        ':08FFF8000001020304050607E5\n',
+        ':020000040001F9\n',
+        ':0800000008090A0B0C0D0E0F9C\n',
+        ':00000001FF\n',
+    ]
+
+
+def test_split_hex_and_srecord_output(tmp_path):
+    # "-s" writes one file per segment for the text formats too
+    src = tmp_path / 'split.asm'
+    src.write_text('.cpu Z80\n0x0000:\n  NOP\n0x8000:\n  HALT\n')
+    a = Assembler(str(src))
+    a.assemble()
+    names = a.write_image(str(tmp_path / 'out.hex'), split=True)
+    assert names == [str(tmp_path / 'out_0000.hex'), str(tmp_path / 'out_8000.hex')]
+    assert (tmp_path / 'out_8000.hex').read_text() == ':018000007609\n:00000001FF\n'
+    names = a.write_image(str(tmp_path / 'out.s19'), split=True)
+    assert names == [str(tmp_path / 'out_0000.s19'), str(tmp_path / 'out_8000.s19')]
+    assert (tmp_path / 'out_0000.s19').read_text().splitlines()[1] == 'S104000000FB'
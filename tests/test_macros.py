@@ -0,0 +1,28 @@
+from opcodetools.assembler.assembler import Assembler
+
+# A macro body line that starts with "#" (written "##" in the source) uses another macro
+NESTED = '''.cpu Z80
+#macro INNER(v)
+#  LD A,:v:
+#macro OUTER(v)
+##INNER(:v:)
+#  INC A
+0x0000:
+#OUTER(1)
+#INNER(2)
+  NOP
+'''
+
+
+def test_nested_macro_expansion(tmp_path):
+    # The nested use inside OUTER and the use right after it are both expanded
+    src = tmp_path / 'nested.asm'
+    src.write_text(NESTED)
+    a = Assembler(str(src))
+    a.assemble()
+    assert a.get_segments() == [(0, bytearray([0x3E, 0x01, 0x3C, 0x3E, 0x02, 0x00]))]
+
+    # The expanded lines follow the lines that used them in the listing
+    texts = [line['text'] for line in a.lines if line['text']]
+    i = texts.index('#OUTER(1)')
+    assert texts[i:i + 6] == ['#OUTER(1)', '#INNER(1)', 'LD A,1', 'INC A', '#INNER(2)', 'LD A,2']
@@ -0,0 +1,21 @@
+from opcodetools.cpu import cpu_manager, table_cache
+
+
+def test_cache_is_off_by_default(monkeypatch, tmp_path):
+    monkeypatch.delenv('OPCODETOOLS_CACHE', raising=False)
+    monkeypatch.setenv('HOME', str(tmp_path))
+    assert table_cache.get_cache_dir() is None
+    assert table_cache.get_cache_dir(True) == str(tmp_path / '.cache' / 'opcodetools')
+    monkeypatch.setenv('OPCODETOOLS_CACHE', '')
+    assert table_cache.get_cache_dir(True) is None
+
+
+def test_save_removes_old_tables(monkeypatch, tmp_path):
+    monkeypatch.setenv('OPCODETOOLS_CACHE', str(tmp_path))
+    cpu = cpu_manager.get_cpu_by_name('Z80')
+    (tmp_path / 'CPU_Z80-1-00000000-1.marshal').write_bytes(b'')
+    (tmp_path / 'CPU_Z80GB-1-00000000-1.marshal').write_bytes(b'')
+    table_cache.save_table(cpu, cpu._opcodes, cpu._decode_root)
+    names = sorted(p.name for p in tmp_path.iterdir())
+    # The old Z80 file is gone (the Z80GB file isn't the same CPU)
+    assert names == [table_cache.get_table_key(cpu) + '.marshal', 'CPU_Z80GB-1-00000000-1.marshal']